@@ -0,0 +1,233 @@
+import copy
+import math
+import numpy as np
+from Camera import Camera
+from Models.GBuffer import GBuffer
+from RenderCache import fingerprint
+from Shapes.Instance import Instance
+
+
+class Frame:
+    """Кадр последовательности: камера и новые матрицы экземпляров.
+
+    camera - Camera кадра (None - камера прежняя); transforms - словарь
+    индекс фигуры в сцене -> матрица 4x4 для фигур Instance.
+    """
+
+    def __init__(self, camera=None, transforms=None):
+        self.camera = camera
+        self.transforms = transforms if transforms is not None else {}
+
+
+def turntable(camera, count, turns=1.0):
+    """Кадры облета камеры вокруг вертикальной оси через точку look_at"""
+    offset = np.asarray(camera.position, dtype=np.float64) - camera.look_at
+    frames = []
+    for i in range(count):
+        angle = 2 * math.pi * turns * i / count
+        c, s = math.cos(angle), math.sin(angle)
+        position = camera.look_at + np.array([c * offset[0] + s * offset[2], offset[1],
+                                              -s * offset[0] + c * offset[2]])
+        frames.append(Frame(Camera(position.astype(np.float32), camera.look_at, camera.up)))
+    return frames
+
+
+class SequenceRenderer:
+    """Рендер последовательности кадров с повторным использованием видимости источника.
+
+    Первичные лучи трассируются в каждом кадре заново (это дешево), лучи тени -
+    только там, где видимость могла измениться. Точка попадания проецируется в
+    предыдущий кадр; если там видна та же неподвижная фигура в той же точке и
+    ни одна сдвинувшаяся фигура не пересекает объем между точкой и источником,
+    сэмплы источника и их видимость берутся из G-буфера предыдущего кадра, а
+    затенение пересчитывается для нового направления взгляда.
+    """
+
+    def __init__(self, tracer, position_tolerance=0.01, normal_tolerance=0.99):
+        self.tracer = tracer
+        self.position_tolerance = position_tolerance  # Допуск сдвига точки, доля расстояния до камеры
+        self.normal_tolerance = normal_tolerance  # Наименьший косинус между нормалями кадров
+        self.reused = []  # Доля пикселей каждого кадра, затененных без лучей тени
+        self._previous = None  # (GBuffer, Camera, состояние сцены) предыдущего кадра
+
+    def reset(self):
+        """Забывает предыдущий кадр: следующий будет оттрассирован целиком"""
+        self._previous = None
+
+    def render(self, frames, seed=0):
+        """Генератор float-изображений (h, w, 3) для последовательности frames"""
+        for index, frame in enumerate(frames):
+            self.apply(frame)
+            yield self.render_frame(np.random.default_rng((seed, index)))
+
+    def apply(self, frame):
+        """Применяет камеру и матрицы кадра к трассировщику и сцене"""
+        scene = self.tracer.scene
+        if frame.camera is not None:
+            self.tracer.camera = frame.camera
+
+        for shape_index, transform in frame.transforms.items():
+            shape = scene.shapes[shape_index]
+            if not isinstance(shape, Instance):
+                raise TypeError(f"Shape {shape_index} is {type(shape).__name__}, only Instance can be transformed")
+            shape.transform = np.asarray(transform, dtype=np.float64)
+
+        if frame.transforms:
+            scene.invalidate()
+
+    def render_frame(self, rng):
+        """Рендерит текущее состояние сцены, используя предыдущий кадр, результат (h, w, 3)"""
+        tracer = self.tracer
+        width, height = tracer.width, tracer.height
+        count = width * height
+        light = tracer.scene.lights[0] if tracer.scene.lights else None
+        gbuffer = GBuffer(width, height, light.table_size() if light else 0)
+
+        ys, xs = np.mgrid[0:height, 0:width]
+        xs, ys = xs.ravel(), ys.ravel()
+        directions = np.empty((count, 3))
+        for start in range(0, count, tracer.batch_size):
+            part = slice(start, start + tracer.batch_size)
+            origins, directions[part] = tracer._primary_rays(xs[part], ys[part])
+            gbuffer.hits.assign(part, tracer.scene.intersect_many(origins, directions[part]))
+
+        state = self._scene_state()
+        pixels, sources = self._reusable(gbuffer, state)
+        if len(pixels):
+            gbuffer.copy_samples(self._previous[0], pixels, sources)
+
+        reused = np.zeros(count, dtype=bool)
+        reused[pixels] = True
+        fresh = np.nonzero(~reused)[0]
+
+        colors = np.empty((count, 3))
+        for start in range(0, len(fresh), tracer.batch_size):
+            part = fresh[start:start + tracer.batch_size]
+            colors[part] = tracer._shade_many(gbuffer.hits.take(part), directions[part], rng, gbuffer, part)
+        for start in range(0, len(pixels), tracer.batch_size):
+            part = pixels[start:start + tracer.batch_size]
+            colors[part] = tracer._shade_from_gbuffer(gbuffer, part, directions[part])
+
+        if tracer.stats is not None:
+            tracer.stats.count('primary_rays', count)
+            tracer.stats.count('reused_pixels', len(pixels))
+
+        self._previous = (gbuffer, copy.deepcopy(tracer.camera), state)
+        self.reused.append(len(pixels) / count)
+        return colors.reshape(height, width, 3)
+
+    def _scene_state(self):
+        """Отпечатки фигур и освещения и границы фигур для сравнения кадров"""
+        scene = self.tracer.scene
+        return {
+            'shapes': [fingerprint(shape) for shape in scene.shapes],
+            'bounds': [shape.bounds() for shape in scene.shapes],
+            'lighting': fingerprint((scene.lights, self.tracer.background, self.tracer.width, self.tracer.height)),
+        }
+
+    def _reusable(self, gbuffer, state):
+        """Пиксели кадра, видимость которых можно взять из предыдущего, и их пиксели-источники"""
+        empty = np.zeros(0, dtype=np.int64)
+        if self._previous is None:
+            return empty, empty
+
+        previous, camera, previous_state = self._previous
+        if (previous_state['lighting'] != state['lighting']
+                or len(previous_state['shapes']) != len(state['shapes'])
+                or previous.max_samples != gbuffer.max_samples):
+            return empty, empty
+
+        # Сдвинувшиеся фигуры: объем, который они занимали в любом из двух кадров
+        moved = [i for i, (old, new) in enumerate(zip(previous_state['shapes'], state['shapes'])) if old != new]
+        boxes = []
+        for i in moved:
+            old, new = previous_state['bounds'][i], state['bounds'][i]
+            if old is None or new is None:
+                return empty, empty  # Бесконечная фигура сдвинулась - меняется все
+            boxes.append((np.minimum(old[0], new[0]), np.maximum(old[1], new[1])))
+
+        hits = gbuffer.hits
+        pixels = np.nonzero(hits.is_valid() & ~np.isin(hits.shape_index, moved))[0]
+        points = hits.point[pixels]
+
+        # Пиксель предыдущего кадра, в который проецируется точка
+        ndc_x, ndc_y, in_front = camera.project(points)
+        with np.errstate(invalid='ignore'):
+            px = np.rint((ndc_x + 1.0) * gbuffer.width / 2.0)
+            py = np.rint((1.0 - ndc_y) * gbuffer.height / 2.0)
+            inside = in_front & (px >= 0) & (px < gbuffer.width) & (py >= 0) & (py < gbuffer.height)
+        pixels, points = pixels[inside], points[inside]
+        sources = (py[inside] * gbuffer.width + px[inside]).astype(np.int64)
+
+        # Там видна та же фигура в той же точке с той же нормалью, и источник проверялся
+        sample_points = previous.sample_point[sources]
+        distance_to_camera = np.linalg.norm(points - self.tracer.camera.position, axis=1)
+        keep = ((previous.hits.shape_index[sources] == hits.shape_index[pixels])
+                & (np.linalg.norm(sample_points - points, axis=1) <= self.position_tolerance * distance_to_camera)
+                & (np.einsum('ij,ij->i', previous.hits.normal[sources], hits.normal[pixels])
+                   >= self.normal_tolerance)
+                & (previous.taken[sources] > 0))
+
+        # Лучи тени лежат в выпуклой оболочке точки и площадки источника: фигура,
+        # не задевшая ее ни в одном из двух кадров, видимость не изменила
+        if boxes and np.any(keep):
+            light = self.tracer.scene.lights[0]
+            drift = np.linalg.norm(sample_points - points, axis=1)
+            for box_min, box_max in boxes:
+                candidates = np.nonzero(keep)[0]
+                blocked = shadow_volume_overlaps(points[candidates], light, box_min, box_max, drift[candidates])
+                keep[candidates[blocked]] = False
+
+        return pixels[keep], sources[keep]
+
+
+def shadow_volume_overlaps(points, light, box_min, box_max, slack=0.0):
+    """Маска точек (N,3), лучи тени которых к площадке light могут задеть рамку [box_min, box_max].
+
+    slack - число или массив (N,): насколько точки могли сдвинуться; проверка
+    консервативна, ложные срабатывания возможны, пропуски - нет.
+    """
+    slack = np.broadcast_to(np.asarray(slack, dtype=np.float64), (len(points),))
+    corners = light.corners()
+    low = np.minimum(points, corners.min(axis=0)) - slack[:, None]
+    high = np.maximum(points, corners.max(axis=0)) + slack[:, None]
+    overlap = np.all((low <= box_max) & (high >= box_min), axis=1)
+    if not np.any(overlap):
+        return overlap
+
+    # Более точная проверка для ограничивающей сферы рамки
+    center = (np.asarray(box_min) + box_max) / 2
+    radius = np.linalg.norm(np.asarray(box_max) - box_min) / 2 + slack[overlap]
+    near = _shadow_volume_distance(points[overlap], corners.mean(axis=0),
+                                   light.size * math.sqrt(0.5), center) <= radius
+    overlap[np.nonzero(overlap)[0][~near]] = False
+    return overlap
+
+
+def _shadow_volume_distance(points, light_center, light_radius, center, iterations=12):
+    """Нижняя оценка расстояния от center до выпуклых оболочек точек points и площадки света.
+
+    Площадка заменяется диском радиуса light_radius вокруг light_center: сечение
+    оболочки на доле s пути к свету лежит в круге радиуса s * light_radius, поэтому
+    оценка - минимум по s выпуклой функции |center - P - s(L - P)| - s * light_radius.
+    """
+    offset = center - points
+    direction = light_center - points
+
+    def value(s):
+        delta = offset - s[:, None] * direction
+        return np.sqrt(np.einsum('ij,ij->i', delta, delta)) - s * light_radius
+
+    # Тернарный поиск минимума выпуклой функции на [0, 1]
+    low = np.zeros(len(points))
+    high = np.ones(len(points))
+    for i in range(iterations):
+        a = low + (high - low) / 3
+        b = high - (high - low) / 3
+        left = value(a) < value(b)
+        high = np.where(left, b, high)
+        low = np.where(left, low, a)
+
+    # Минимум лежит в [low, high], функция липшицева с константой |L - P| + light_radius
+    slack = (high - low) / 2 * (np.linalg.norm(direction, axis=1) + light_radius)
+    return value((low + high) / 2) - slack
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Смещения подпикселей по повернутой сетке (rotated grid) относительно луча пикселя
+SUBPIXEL_OFFSETS = np.array([
+    [0.125, 0.375],
+    [-0.375, 0.125],
+    [-0.125, -0.375],
+    [0.375, -0.125],
+    [0.25, 0.0],
+    [-0.25, 0.0],
+    [0.0, 0.25],
+    [0.0, -0.25],
+])
+
+
+def edge_contrast(colors, depth, shape_ids, color_threshold=0.1, depth_threshold=0.05):
+    """Оценка разрыва для каждого пикселя изображения (h, w).
+
+    Пиксель считается краевым, если с соседом справа или снизу у него
+    различается фигура, относительная глубина больше depth_threshold или
+    цвет больше color_threshold по какому-либо каналу. Результат - массив
+    (h, w) с нулем для гладких пикселей; больше значение - сильнее разрыв.
+    """
+    contrast = np.zeros(depth.shape)
+
+    for axis in (0, 1):
+        color_diff = np.abs(np.diff(colors, axis=axis)).max(axis=2)
+        shape_diff = np.diff(shape_ids, axis=axis) != 0
+
+        near = np.minimum(_trim(depth, axis, 0), _trim(depth, axis, 1))
+        far = np.maximum(_trim(depth, axis, 0), _trim(depth, axis, 1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            depth_diff = np.where(np.isfinite(far), (far - near) / near, 0.0)
+
+        score = np.where(color_diff > color_threshold, color_diff, 0.0)
+        score = np.maximum(score, np.where(depth_diff > depth_threshold, np.minimum(depth_diff, 1.0), 0.0))
+        score = np.maximum(score, shape_diff * 1.0)
+
+        # Разрыв помечает обоих соседей
+        _accumulate(contrast, score, axis)
+
+    return contrast
+
+
+def select_pixels(contrast, budget):
+    """Индексы (ys, xs) самых контрастных краевых пикселей, не больше budget штук"""
+    flat = np.nonzero(contrast.ravel() > 0)[0]
+    if len(flat) > budget:
+        strongest = np.argpartition(contrast.ravel()[flat], len(flat) - budget)[len(flat) - budget:]
+        flat = flat[strongest]
+    return np.unravel_index(flat, contrast.shape)
+
+
+def _trim(array, axis, side):
+    """Срез массива без последнего (side=0) или первого (side=1) элемента по оси"""
+    if axis == 0:
+        return array[:-1] if side == 0 else array[1:]
+    return array[:, :-1] if side == 0 else array[:, 1:]
+
+
+def _accumulate(contrast, score, axis):
+    """Поднимает оценку обоих пикселей каждой пары соседей до score"""
+    if axis == 0:
+        contrast[:-1] = np.maximum(contrast[:-1], score)
+        contrast[1:] = np.maximum(contrast[1:], score)
+    else:
+        contrast[:, :-1] = np.maximum(contrast[:, :-1], score)
+        contrast[:, 1:] = np.maximum(contrast[:, 1:], score)
@@ -1,17 +1,24 @@
 import numpy as np
-import random
 from MathUtils import vector3
+from Samplers import RandomSampler
 
 
 class AreaLight:
-    def __init__(self, position=None, size=1.0, samples=16):
+    def __init__(self, position=None, size=1.0, samples=16, sampler=None):
         self.position = position if position is not None else vector3(0, 5, 0)
         self.size = size
         self.samples = samples
+        self.sampler = sampler if sampler is not None else RandomSampler()
         self.diffuse = np.ones(3, dtype=np.float32)
         self.specular = np.ones(3, dtype=np.float32)
         self.ambient = vector3(0.1, 0.1, 0.1)
 
+        # Адаптивная выборка: сначала min_samples лучей тени, дальше - только в полутени
+        self.adaptive = False
+        self.min_samples = 4
+        self.max_samples = samples
+        self.variance_threshold = 0.01
+
     # Свойства для совместимости с C#
     @property
     def Position(self):
@@ -61,18 +68,96 @@ class AreaLight:
     def Ambient(self, value):
         self.ambient = value
 
-    def get_samples_points(self):
-        """Генерирует точки выборки на площади источника света"""
-        points = []
-
-        for i in range(self.samples):
-            u = random.random()
-            v = random.random()
-
-            x = self.position[0] + (u - 0.5) * self.size
-            y = self.position[1]
-            z = self.position[2] + (v - 0.5) * self.size
-
-            points.append(vector3(x, y, z))
+    @property
+    def AdaptiveSampling(self):
+        return self.adaptive
+
+    @AdaptiveSampling.setter
+    def AdaptiveSampling(self, value):
+        self.adaptive = value
+
+    def first_batch_size(self):
+        """Сколько лучей тени бросать в первой серии"""
+        return min(self.min_samples, self.max_samples) if self.adaptive else self.samples
+
+    def needs_more_samples(self, visible, taken):
+        """Нужна ли еще серия лучей тени при visible видимых сэмплах из taken.
+
+        Работает и со скалярами, и с массивами. Пока все сэмплы согласны
+        (полный свет или полная тень), выборка прекращается; в полутени она
+        продолжается, пока дисперсия оценки видимости выше variance_threshold
+        и не исчерпан бюджет max_samples.
+        """
+        if not self.adaptive:
+            return np.zeros_like(np.asarray(taken), dtype=bool)
+
+        visible = np.asarray(visible, dtype=np.float64)
+        taken = np.asarray(taken, dtype=np.float64)
+        p = visible / taken
+        return ((taken < self.max_samples) & (visible > 0) & (visible < taken)
+                & (p * (1 - p) / taken > self.variance_threshold))
+
+    def next_batch_size(self, taken):
+        """Размер следующей серии лучей тени после taken уже брошенных"""
+        return max(0, min(self.min_samples, self.max_samples - taken))
 
-        return points
\ No newline at end of file
+    @property
+    def Sampler(self):
+        return self.sampler
+
+    @Sampler.setter
+    def Sampler(self, value):
+        self.sampler = value
+
+    def table_size(self):
+        """Размер таблицы выборки: хватает и на адаптивный бюджет"""
+        return max(self.samples, self.max_samples) if self.adaptive else self.samples
+
+    def sample_rotation(self, rng=None):
+        """Сдвиг таблицы выборки для одной точки сцены (None для случайной выборки)"""
+        return self.sampler.rotation(rng)
+
+    def sample_rotations(self, count, rng=None):
+        """Сдвиги таблицы выборки для count точек сцены"""
+        return self.sampler.rotations(count, rng)
+
+    def get_samples_points(self, rng=None, count=None, start=0, rotation=None):
+        """Генерирует точки выборки на площади источника света, результат (count, 3).
+
+        rng - необязательный генератор с методом random() (random.Random или
+        numpy.random.Generator); по умолчанию используется модуль random.
+        count - число точек, по умолчанию samples; start - номер первой точки
+        в таблице выборки, rotation - сдвиг таблицы для этой точки сцены.
+        """
+        count = count if count is not None else self.samples
+        uv = self.sampler.points(self.table_size(), count, start, rotation, rng)
+        return self._to_light_plane(uv, np.float32)
+
+    def get_samples_points_many(self, count, rng=None, samples=None, start=0, rotations=None):
+        """Точки выборки для count точек сцены сразу, результат (count, samples, 3)"""
+        return self.uv_to_points(self.get_samples_uv_many(count, rng, samples, start, rotations))
+
+    def get_samples_uv_many(self, count, rng=None, samples=None, start=0, rotations=None):
+        """Как get_samples_points_many, но в координатах единичного квадрата, результат (count, samples, 2)"""
+        samples = samples if samples is not None else self.samples
+        rng = rng if rng is not None else np.random.default_rng()
+        return self.sampler.points_many(self.table_size(), count, samples, start, rotations, rng)
+
+    def uv_to_points(self, uv):
+        """Точки площадки источника (..., 3) float64 для координат единичного квадрата (..., 2)"""
+        return self._to_light_plane(uv, np.float64)
+
+    def corners(self):
+        """Углы площадки источника, массив (4, 3)"""
+        return self.uv_to_points(np.array([[0.0, 0.0], [0.0, 1.0], [1.0, 0.0], [1.0, 1.0]]))
+
+    def _to_light_plane(self, uv, dtype):
+        """Переводит точки единичного квадрата в точки на площадке источника"""
+        offsets = ((uv - 0.5) * self.size).astype(dtype)
+
+        points = np.empty(uv.shape[:-1] + (3,), dtype=dtype)
+        points[..., 0] = self.position[0] + offsets[..., 0]
+        points[..., 1] = self.position[1]
+        points[..., 2] = self.position[2] + offsets[..., 1]
+
+        return points
@@ -0,0 +1,249 @@
+import numpy as np
+
+# Массивы, полностью описывающие построенное дерево
+ARRAY_NAMES = ('node_min', 'node_max', 'node_right', 'node_start', 'node_count', 'indices')
+
+
+class BVH:
+    """Иерархия ограничивающих объемов (AABB), построенная по SAH.
+
+    Дерево хранится в плоских массивах NumPy в порядке обхода в глубину:
+    левый потомок внутреннего узла i всегда i + 1, правый - node_right[i].
+    У листа node_count > 0, а его примитивы - indices[node_start:node_start + node_count].
+    """
+
+    def __init__(self, bounds_min, bounds_max, leaf_size=4, bins=12):
+        bounds_min = np.asarray(bounds_min, dtype=np.float64).reshape(-1, 3)
+        bounds_max = np.asarray(bounds_max, dtype=np.float64).reshape(-1, 3)
+
+        self.leaf_size = leaf_size
+        self.bins = bins
+
+        self._prim_min = bounds_min
+        self._prim_max = bounds_max
+        self._centroids = (bounds_min + bounds_max) * 0.5
+
+        nodes_min, nodes_max, right, start, count = [], [], [], [], []
+        order = []
+        self._build(np.arange(len(bounds_min)), nodes_min, nodes_max, right, start, count, order)
+
+        self.node_min = np.array(nodes_min).reshape(-1, 3)
+        self.node_max = np.array(nodes_max).reshape(-1, 3)
+        self.node_right = np.array(right, dtype=np.int64)
+        self.node_start = np.array(start, dtype=np.int64)
+        self.node_count = np.array(count, dtype=np.int64)
+        self.indices = np.array(order, dtype=np.int64)
+
+        del self._prim_min, self._prim_max, self._centroids
+        self._prepare_lists()
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Восстанавливает дерево из словаря to_arrays() без повторного построения"""
+        bvh = cls.__new__(cls)
+        bvh.leaf_size = int(arrays['leaf_size'])
+        bvh.bins = int(arrays['bins'])
+        for name in ARRAY_NAMES:
+            setattr(bvh, name, np.asarray(arrays[name]))
+        bvh._prepare_lists()
+        return bvh
+
+    def to_arrays(self):
+        """Массивы дерева для сохранения (например, np.savez)"""
+        arrays = {name: getattr(self, name) for name in ARRAY_NAMES}
+        arrays['leaf_size'] = self.leaf_size
+        arrays['bins'] = self.bins
+        return arrays
+
+    def _prepare_lists(self):
+        # Списки Python для скалярного обхода: индексация массивов NumPy там дороже
+        self._node_list = list(zip(self.node_min.tolist(), self.node_max.tolist(),
+                                   self.node_right.tolist(), self.node_start.tolist(),
+                                   self.node_count.tolist()))
+        self._index_list = self.indices.tolist()
+
+    def __len__(self):
+        return len(self.node_count)
+
+    @property
+    def bounds(self):
+        """Границы корневого узла (min, max)"""
+        return self.node_min[0], self.node_max[0]
+
+    def _build(self, prims, nodes_min, nodes_max, right, start, count, order):
+        """Рекурсивно строит узел для примитивов prims и возвращает его индекс"""
+        index = len(nodes_min)
+        nodes_min.append(self._prim_min[prims].min(axis=0))
+        nodes_max.append(self._prim_max[prims].max(axis=0))
+        right.append(-1)
+        start.append(len(order))
+        count.append(0)
+
+        split = self._find_split(prims, nodes_max[index] - nodes_min[index]) \
+            if len(prims) > self.leaf_size else None
+
+        if split is None:
+            count[index] = len(prims)
+            order.extend(prims.tolist())
+            return index
+
+        left_prims, right_prims = split
+        self._build(left_prims, nodes_min, nodes_max, right, start, count, order)
+        right[index] = self._build(right_prims, nodes_min, nodes_max, right, start, count, order)
+        return index
+
+    def _find_split(self, prims, extent):
+        """Лучшее разбиение по SAH на корзинах либо None, если выгоднее лист"""
+        centroids = self._centroids[prims]
+        low = centroids.min(axis=0)
+        high = centroids.max(axis=0)
+        spread = high - low
+
+        if not np.any(spread > 0):
+            return None
+
+        best_cost = np.inf
+        best = None
+
+        for axis in np.nonzero(spread > 0)[0]:
+            scaled = (centroids[:, axis] - low[axis]) / spread[axis] * self.bins
+            bin_index = np.minimum(scaled.astype(np.int64), self.bins - 1)
+
+            bin_count = np.bincount(bin_index, minlength=self.bins)
+            bin_min = np.full((self.bins, 3), np.inf)
+            bin_max = np.full((self.bins, 3), -np.inf)
+            np.minimum.at(bin_min, bin_index, self._prim_min[prims])
+            np.maximum.at(bin_max, bin_index, self._prim_max[prims])
+
+            # Площади и количества слева/справа для каждой из bins - 1 плоскостей
+            left_count = np.cumsum(bin_count)[:-1]
+            right_count = np.cumsum(bin_count[::-1])[::-1][1:]
+            left_area = _surface_area(np.minimum.accumulate(bin_min)[:-1],
+                                      np.maximum.accumulate(bin_max)[:-1])
+            right_area = _surface_area(np.minimum.accumulate(bin_min[::-1])[::-1][1:],
+                                       np.maximum.accumulate(bin_max[::-1])[::-1][1:])
+
+            cost = left_area * left_count + right_area * right_count
+            cost[(left_count == 0) | (right_count == 0)] = np.inf
+
+            plane = int(np.argmin(cost))
+            if cost[plane] < best_cost:
+                best_cost = cost[plane]
+                best = bin_index <= plane
+
+        if best is None:
+            return None
+
+        # Стоимость листа против стоимости разбиения (обход узла ~ одному пересечению)
+        node_area = _surface_area(np.zeros((1, 3)), extent[None, :])[0]
+        if best_cost / max(node_area, 1e-12) + 1 >= len(prims) and len(prims) <= 4 * self.leaf_size:
+            return None
+
+        return prims[best], prims[~best]
+
+    def traverse(self, origin, direction, visit, max_distance=np.inf):
+        """Скалярный обход для одного луча.
+
+        visit(primitives) вызывается для каждого пересеченного листа и должен
+        вернуть текущую дистанцию отсечения (например, ближайшее пересечение).
+        """
+        ox, oy, oz = (float(x) for x in origin)
+        inv = [1.0 / float(x) if x != 0 else np.inf for x in direction]
+        ix, iy, iz = inv
+        nodes = self._node_list
+        stack = [0]
+
+        while stack:
+            index = stack.pop()
+            if max_distance < 0:
+                break
+            node_min, node_max, right, start, count = nodes[index]
+
+            tx0 = (node_min[0] - ox) * ix
+            tx1 = (node_max[0] - ox) * ix
+            ty0 = (node_min[1] - oy) * iy
+            ty1 = (node_max[1] - oy) * iy
+            tz0 = (node_min[2] - oz) * iz
+            tz1 = (node_max[2] - oz) * iz
+            t_near = max(min(tx0, tx1), min(ty0, ty1), min(tz0, tz1), 0.0)
+            t_far = min(max(tx0, tx1), max(ty0, ty1), max(tz0, tz1), max_distance)
+
+            # nan (луч в плоскости грани) отбрасывает узел - допустимая погрешность
+            if not t_near <= t_far:
+                continue
+
+            if count:
+                max_distance = visit(self._index_list[start:start + count])
+            else:
+                stack.append(right)
+                stack.append(index + 1)
+
+        return max_distance
+
+    def any_hit(self, origin, direction, test, max_distance=np.inf):
+        """Скалярный запрос "есть ли хоть одно пересечение".
+
+        test(primitives) вызывается для пересеченных листов; обход прекращается
+        на первом листе, для которого test вернул True.
+        """
+        hit = False
+
+        def visit(primitives):
+            nonlocal hit
+            hit = test(primitives)
+            # Отрицательная дистанция отсекает все оставшиеся узлы
+            return -1.0 if hit else max_distance
+
+        self.traverse(origin, direction, visit, max_distance)
+        return hit
+
+    def any_hit_many(self, origins, directions, test, max_distances):
+        """Пакетная версия any_hit.
+
+        test(primitives, rays) возвращает булеву маску перекрытых лучей из rays;
+        такие лучи выбывают из дальнейшего обхода. Результат - маска (N,).
+        """
+        def visit(primitives, rays):
+            return np.where(test(primitives, rays), -np.inf, max_distances[rays])
+
+        return self.traverse_many(origins, directions, visit, max_distances) == -np.inf
+
+    def traverse_many(self, origins, directions, visit, max_distance=None):
+        """Пакетный обход для лучей (N,3).
+
+        visit(primitives, rays) вызывается для листа и индексов лучей пакета,
+        которые до него дошли, и возвращает новые дистанции отсечения этих лучей.
+        """
+        count = len(origins)
+        limit = np.full(count, np.inf) if max_distance is None else np.array(max_distance, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            inv = 1.0 / directions
+
+        stack = [(0, np.arange(count))]
+        while stack:
+            node, rays = stack.pop()
+
+            with np.errstate(invalid='ignore'):
+                t0 = (self.node_min[node] - origins[rays]) * inv[rays]
+                t1 = (self.node_max[node] - origins[rays]) * inv[rays]
+                t_near = np.maximum(np.minimum(t0, t1).max(axis=1), 0.0)
+                t_far = np.minimum(np.maximum(t0, t1).min(axis=1), limit[rays])
+            rays = rays[t_near <= t_far]
+
+            if len(rays) == 0:
+                continue
+
+            if self.node_count[node]:
+                start = self.node_start[node]
+                limit[rays] = visit(self.indices[start:start + self.node_count[node]], rays)
+            else:
+                stack.append((self.node_right[node], rays))
+                stack.append((node + 1, rays))
+
+        return limit
+
+
+def _surface_area(bounds_min, bounds_max):
+    """Площадь поверхности AABB для массивов границ (K,3)"""
+    extent = np.maximum(bounds_max - bounds_min, 0)
+    return 2 * (extent[:, 0] * extent[:, 1] + extent[:, 1] * extent[:, 2] + extent[:, 2] * extent[:, 0])
@@ -0,0 +1,56 @@
+import numpy as np
+from MathUtils import vector3, normalize, cross
+
+
+class Camera:
+    def __init__(self, position=None, look_at=None, up=None):
+        self.position = position if position is not None else vector3(0, 1, 3)
+        self.look_at = look_at if look_at is not None else vector3(0, 0, -5)
+        self.up = up if up is not None else vector3(0, 1, 0)
+
+    # Свойства для совместимости с C#
+    @property
+    def Position(self):
+        return self.position
+
+    @Position.setter
+    def Position(self, value):
+        self.position = value
+
+    @property
+    def LookAt(self):
+        return self.look_at
+
+    @LookAt.setter
+    def LookAt(self, value):
+        self.look_at = value
+
+    @property
+    def forward(self):
+        """Направление взгляда камеры"""
+        return normalize(self.look_at - self.position)
+
+    @property
+    def right(self):
+        """Вектор вправо в плоскости экрана"""
+        return normalize(cross(self.forward, self.up))
+
+    def ray_direction(self, ndc_x, ndc_y):
+        """Направление луча через точку экрана в координатах NDC"""
+        return normalize(self.forward + self.right * ndc_x + self.up * ndc_y)
+
+    def ray_directions(self, ndc_x, ndc_y):
+        """Направления лучей для массивов координат NDC, результат (N,3)"""
+        directions = (self.forward[None, :]
+                      + np.outer(ndc_x, self.right)
+                      + np.outer(ndc_y, self.up)).astype(np.float64)
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        return directions
+
+    def project(self, points):
+        """Обратное к ray_directions: координаты NDC точек (N,3) и маска точек перед камерой"""
+        basis = np.stack([self.forward, self.right, self.up], axis=1).astype(np.float64)
+        # points - position = a * forward + b * right + c * up, тогда ndc = (b / a, c / a)
+        a, b, c = np.linalg.solve(basis, (np.asarray(points, dtype=np.float64) - self.position).T)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return b / a, c / a, a > 0
@@ -0,0 +1,61 @@
+import numpy as np
+
+# Ядро B3-сплайна à-trous; двумерное ядро - внешнее произведение
+ATROUS_KERNEL = np.array([1 / 16, 1 / 4, 3 / 8, 1 / 4, 1 / 16])
+
+
+def denoise_visibility(visibility, depth, normals, shape_ids, iterations=2,
+                       depth_sigma=0.01, normal_power=32):
+    """Сглаживает видимость источника (h, w) à-trous фильтром с учетом краев.
+
+    На i-м проходе ядро 5x5 растягивается с шагом 2^i. Вес соседа - вес ядра,
+    умноженный на exp(-|dz| / (depth_sigma * z)) по относительной глубине и
+    max(0, n.n')^normal_power по нормалям; соседи с другой фигурой и промахи
+    не учитываются. Тени не размываются через края объектов.
+    """
+    result = np.asarray(visibility, dtype=np.float64).copy()
+    depth = np.asarray(depth, dtype=np.float64)
+    valid = shape_ids >= 0
+    scale = np.where(valid, depth_sigma * depth, 1.0)
+    height, width = result.shape
+
+    for level in range(iterations):
+        step = 1 << level
+        total = np.zeros_like(result)
+        weights = np.zeros_like(result)
+
+        for i, ky in enumerate(ATROUS_KERNEL):
+            dy = (i - 2) * step
+            if abs(dy) >= height:
+                continue
+            for j, kx in enumerate(ATROUS_KERNEL):
+                dx = (j - 2) * step
+                if abs(dx) >= width:
+                    continue
+                target, source = _offset_slices(dy, dx)
+
+                same = valid[target] & (shape_ids[source] == shape_ids[target])
+                with np.errstate(invalid='ignore'):
+                    depth_weight = np.exp(-np.abs(depth[source] - depth[target]) / scale[target])
+                normal_weight = np.maximum(0, np.einsum('ijk,ijk->ij', normals[source], normals[target]))
+                weight = np.where(same, ky * kx * depth_weight * normal_weight ** normal_power, 0.0)
+
+                total[target] += weight * result[source]
+                weights[target] += weight
+
+        # Пиксели без соседей (промахи) остаются как есть
+        result = np.where(weights > 0, total / np.where(weights > 0, weights, 1.0), result)
+
+    return result
+
+
+def _offset_slices(dy, dx):
+    """Срезы пикселей (target, source), где source = target + (dy, dx) внутри кадра"""
+    def axis(d):
+        if d >= 0:
+            return slice(0, -d or None), slice(d, None)
+        return slice(-d, None), slice(0, d)
+
+    target_y, source_y = axis(dy)
+    target_x, source_x = axis(dx)
+    return (target_y, target_x), (source_y, source_x)
@@ -0,0 +1,304 @@
+import argparse
+import multiprocessing
+import pickle
+import queue
+import secrets
+import signal
+import threading
+import time
+import numpy as np
+from multiprocessing.connection import Listener, Client
+from RenderStats import ProgressReporter
+from RayTracer import _init_tile_worker, _render_tile
+
+
+class TileCoordinator:
+    """Координатор распределенного рендера: раздает тайлы процессам run_worker по TCP.
+
+    Трассировщик со сценой сериализуется один раз на кадр и отправляется
+    каждому подключившемуся процессу, дальше по соединению идут только
+    задания тайлов и готовые тайлы. Когда очередь тайлов пуста, свободный
+    процесс получает копию еще не готового тайла другого процесса - кадр не
+    ждет зависший процесс, а лишний результат отбрасывается. Тайл, чей
+    процесс отключился или не ответил за tile_timeout секунд, возвращается в
+    очередь и достается другому процессу; после max_attempts таких неудач рендер кадра падает
+    с RuntimeError, как и когда без единого подключенного процесса проходит
+    worker_timeout секунд. Процессы могут подключаться в любой момент, в том
+    числе посреди кадра. Кеш видимости трассировщика уходит процессам вместе с
+    кадром, а его пополнения возвращаются с тайлами. Сообщения - pickle,
+    поэтому authkey должен знать только свой кластер: без него генерируется
+    случайный ключ (свойство authkey). Сетки TriangleMesh читаются
+    процессами с диска по тому же пути, что и у координатора.
+    """
+
+    def __init__(self, tracer, address=('127.0.0.1', 0), authkey=None, tile_size=32, seed=0,
+                 tile_timeout=60.0, max_attempts=3, worker_timeout=30.0):
+        self.tracer = tracer
+        self.tile_size = tile_size
+        self.seed = seed
+        self.tile_timeout = tile_timeout
+        self.max_attempts = max_attempts
+        self.worker_timeout = worker_timeout
+        self.connected = 0  # Сколько процессов подключалось
+        self.active = 0  # Сколько процессов подключено сейчас
+        self.reassigned = 0  # Сколько раз тайл отдавался повторно
+        self._authkey = authkey if authkey is not None else secrets.token_hex(16).encode()
+        self._listener = Listener(address, authkey=self._authkey)
+        self._job = None
+        self._job_changed = threading.Condition()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._local_workers = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def address(self):
+        """Адрес (хост, порт), к которому подключаются процессы"""
+        return self._listener.address
+
+    @property
+    def authkey(self):
+        """Ключ, который процессы передают run_worker (и Distributed.py --authkey)"""
+        return self._authkey
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start_local_workers(self, count):
+        """Запускает count процессов run_worker на этой машине"""
+        host, port = self.address
+        address = ('127.0.0.1' if host == '0.0.0.0' else host, port)
+        for i in range(count):
+            process = multiprocessing.Process(target=_run_local_worker, args=(address, self._authkey), daemon=True)
+            process.start()
+            self._local_workers.append(process)
+        return self._local_workers[-count:] if count else []
+
+    def close(self):
+        """Отпускает процессы и закрывает порт"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._job_changed:
+            self._job_changed.notify_all()
+        # Подключение к себе будит поток, ожидающий accept()
+        try:
+            Client(self.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        self._listener.close()
+        for process in self._local_workers:
+            process.join(timeout=5)
+
+    def render_image(self):
+        """Рендерит кадр трассировщика распределенно, результат - float-изображение (h, w, 3)"""
+        image = np.zeros((self.tracer.height, self.tracer.width, 3))
+        for x0, y0, tile in self.iter_tiles():
+            image[y0:y0 + tile.shape[0], x0:x0 + tile.shape[1]] = tile
+        return image
+
+    def iter_tiles(self):
+        """Как RayTracer.iter_tiles, но тайлы рендерят подключенные процессы"""
+        tracer = self.tracer
+        tiles = tracer._tiles(self.tile_size, self.seed)
+        if tracer.visibility_cache is not None:
+            tracer.visibility_cache.validate(tracer.scene)
+        job = _Job(pickle.dumps(tracer), tiles)
+        progress = ProgressReporter(tracer.progress_callback, tracer.width * tracer.height, tracer.progress_interval)
+        done = job.done
+        pixels = 0
+
+        with self._job_changed:
+            self._job = job
+            self._job_changed.notify_all()
+
+        try:
+            idle_since = None
+            while len(done) < len(tiles):
+                try:
+                    result = job.results.get(timeout=0.5)
+                except queue.Empty:
+                    # Без процессов кадр не закончится: ждем подключения не дольше worker_timeout
+                    if self.active:
+                        idle_since = None
+                    elif idle_since is None:
+                        idle_since = time.monotonic()
+                    elif time.monotonic() - idle_since > self.worker_timeout:
+                        raise RuntimeError(f"No workers connected for {self.worker_timeout} s, "
+                                           f"{len(tiles) - len(done)} tiles left")
+                    continue
+                if isinstance(result, Exception):
+                    raise result
+
+                x0, y0, tile, tile_stats, tile_cache = result
+                with self._lock:
+                    if (x0, y0) in done:
+                        continue  # Копию тайла досчитал другой процесс
+                    done.add((x0, y0))
+                if tracer.stats is not None:
+                    tracer.stats.merge(tile_stats)
+                if tracer.visibility_cache is not None:
+                    tracer.visibility_cache.merge(tile_cache)
+                pixels += tile.shape[0] * tile.shape[1]
+                progress.update(pixels)
+                yield x0, y0, tile
+        finally:
+            with self._job_changed:
+                self._job = None
+
+    def _accept(self):
+        """Поток приема подключений: на каждый процесс свой поток _serve"""
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            if self._closed:
+                connection.close()
+                return
+            with self._lock:
+                self.connected += 1
+                self.active += 1
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        """Раздает тайлы одному процессу, пока координатор не закрыт или процесс не пропал"""
+        sent_job = None
+        job = tile = None
+        try:
+            while not self._closed:
+                job, tile = self._next_tile()
+                if tile is None:
+                    continue
+
+                if job is not sent_job:
+                    connection.send(('scene', job.payload))
+                    sent_job = job
+                connection.send(('tile', tile))
+                if self.tile_timeout is not None and not connection.poll(self.tile_timeout):
+                    raise TimeoutError(f"Tile {tile[:2]} timed out")
+                job.results.put(connection.recv())
+                self._release(job, tile)
+                tile = None
+
+            connection.send(('done',))
+        except (OSError, EOFError, TimeoutError):
+            if tile is not None:
+                self._release(job, tile)
+                self._retry(job, tile)
+        finally:
+            connection.close()
+            with self._lock:
+                self.active -= 1
+
+    def _retry(self, job, tile):
+        """Процесс пропал с тайлом на руках: тайл отдадим другому, если попытки не кончились"""
+        with self._lock:
+            if tile[:2] in job.done:
+                return  # Копию тайла уже досчитал другой процесс
+            attempts = job.attempts[tile[:2]] = job.attempts.get(tile[:2], 0) + 1
+            if attempts < self.max_attempts:
+                self.reassigned += 1
+        if attempts < self.max_attempts:
+            job.pending.put(tile)
+        else:
+            job.results.put(RuntimeError(f"Tile {tile[:2]} failed on {attempts} workers"))
+
+    def _next_tile(self):
+        """Следующее задание текущего кадра (job, tile) или (job, None), если заданий пока нет"""
+        with self._job_changed:
+            if self._job is None and not self._closed:
+                self._job_changed.wait(0.5)
+            job = self._job
+        if job is None:
+            return None, None
+        try:
+            tile = job.pending.get(timeout=0.1)
+        except queue.Empty:
+            tile = None
+
+        with self._lock:
+            if tile is None:
+                tile = self._straggler(job)
+            if tile is not None:
+                job.holders[tile[:2]] = job.holders.get(tile[:2], 0) + 1
+        return job, tile
+
+    def _straggler(self, job):
+        """Самый давно выданный тайл, который считает ровно один процесс и который еще не готов"""
+        for key, holders in job.holders.items():
+            if holders == 1 and key not in job.done:
+                return job.tiles[key]
+        return None
+
+    def _release(self, job, tile):
+        with self._lock:
+            job.holders[tile[:2]] -= 1
+
+
+class _Job:
+    """Кадр распределенного рендера: сериализованный трассировщик и очереди тайлов"""
+
+    def __init__(self, payload, tiles):
+        self.payload = payload
+        self.pending = queue.Queue()
+        self.results = queue.Queue()  # Готовые тайлы или RuntimeError для iter_tiles
+        self.attempts = {}  # (x0, y0) -> сколько раз процесс пропал с тайлом
+        self.holders = {}  # (x0, y0) -> сколько процессов считают тайл сейчас, в порядке выдачи
+        self.done = set()  # (x0, y0) готовых тайлов
+        self.tiles = {tile[:2]: tile for tile in tiles}
+        for tile in tiles:
+            self.pending.put(tile)
+
+
+def run_worker(address, authkey):
+    """Подключается к координатору по address и рендерит тайлы, пока он не отпустит.
+
+    Возвращает число отрендеренных тайлов.
+    """
+    rendered = 0
+    with Client(address, authkey=authkey) as connection:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                return rendered  # Координатор закрылся
+            if message[0] == 'done':
+                return rendered
+            if message[0] == 'scene':
+                _init_tile_worker(message[1])
+                continue
+            try:
+                connection.send(_render_tile(message[1]))
+            except OSError:
+                return rendered  # Координатор счел процесс зависшим и закрыл соединение
+            rendered += 1
+
+
+def _run_local_worker(address, authkey):
+    # Обработчик SIGTERM, унаследованный от pygame родителя, мешает завершить процесс
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    run_worker(address, authkey)
+
+
+def parse_address(text):
+    """Адрес 'хост:порт' в кортеж (хост, порт)"""
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tile worker for distributed Lab8 rendering")
+    parser.add_argument('address', help="coordinator address, host:port")
+    parser.add_argument('--authkey', required=True, help="shared key printed by the coordinator")
+    args = parser.parse_args(argv)
+
+    rendered = run_worker(parse_address(args.address), args.authkey.encode())
+    print(f"Rendered {rendered} tiles")
+
+
+if __name__ == '__main__':
+    main()
@@ -76,4 +76,176 @@ def right():
 
 def left():
     """Вектор влево (-1, 0, 0)"""
-    return vector3(-1, 0, 0)
\ No newline at end of file
+    return vector3(-1, 0, 0)
+
+def translation_matrix(x=0.0, y=0.0, z=0.0):
+    """Матрица 4x4 переноса на (x, y, z)"""
+    matrix = np.eye(4)
+    matrix[:3, 3] = (x, y, z)
+    return matrix
+
+def scale_matrix(x=1.0, y=None, z=None):
+    """Матрица 4x4 масштабирования (одно число - равномерное)"""
+    y = x if y is None else y
+    z = x if z is None else z
+    return np.diag([x, y, z, 1.0])
+
+def rotation_matrix(axis, angle):
+    """Матрица 4x4 поворота вокруг оси axis на угол angle (радианы, формула Родрига)"""
+    x, y, z = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    c = math.cos(angle)
+    s = math.sin(angle)
+    t = 1 - c
+
+    matrix = np.eye(4)
+    matrix[:3, :3] = [
+        [t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+        [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+        [t * x * z - s * y, t * y * z + s * x, t * z * z + c],
+    ]
+    return matrix
+
+class NumpyMath:
+    """Бэкенд векторной математики по умолчанию: векторы - массивы NumPy"""
+    vector3 = staticmethod(vector3)
+    dot = staticmethod(dot)
+    normalize = staticmethod(normalize)
+    cross = staticmethod(cross)
+    reflect = staticmethod(reflect)
+    length = staticmethod(length)
+    distance = staticmethod(distance)
+    clamp = staticmethod(clamp)
+    lerp = staticmethod(lerp)
+    magnitude_squared = staticmethod(magnitude_squared)
+
+    @staticmethod
+    def convert(vector):
+        """Вектор в представлении бэкенда"""
+        return np.asarray(vector)
+
+    @staticmethod
+    def rows(array):
+        """Строки массива (N,3) как последовательность векторов бэкенда"""
+        return array
+
+    @staticmethod
+    def add(v1, v2):
+        return v1 + v2
+
+    @staticmethod
+    def sub(v1, v2):
+        return v1 - v2
+
+    @staticmethod
+    def mul(v1, v2):
+        """Покомпонентное произведение"""
+        return v1 * v2
+
+    @staticmethod
+    def scale(vector, factor):
+        return vector * factor
+
+    @staticmethod
+    def divide(vector, divisor):
+        return vector / divisor
+
+
+class ScalarMath:
+    """Те же операции над кортежами (x, y, z) из обычных float.
+
+    На векторах из трех чисел накладные расходы вызова NumPy намного больше
+    самой арифметики, поэтому скалярный трассировщик быстрее на этом бэкенде.
+    """
+
+    @staticmethod
+    def vector3(x=0.0, y=0.0, z=0.0):
+        return float(x), float(y), float(z)
+
+    @staticmethod
+    def convert(vector):
+        x, y, z = vector
+        return float(x), float(y), float(z)
+
+    @staticmethod
+    def rows(array):
+        return array.tolist()
+
+    @staticmethod
+    def dot(v1, v2):
+        return v1[0] * v2[0] + v1[1] * v2[1] + v1[2] * v2[2]
+
+    @staticmethod
+    def normalize(vector):
+        x, y, z = vector
+        norm = math.sqrt(x * x + y * y + z * z)
+        if norm == 0:
+            return vector
+        return x / norm, y / norm, z / norm
+
+    @staticmethod
+    def cross(v1, v2):
+        x1, y1, z1 = v1
+        x2, y2, z2 = v2
+        return y1 * z2 - z1 * y2, z1 * x2 - x1 * z2, x1 * y2 - y1 * x2
+
+    @staticmethod
+    def reflect(incident, normal):
+        x, y, z = incident
+        nx, ny, nz = normal
+        k = 2 * (x * nx + y * ny + z * nz)
+        return x - k * nx, y - k * ny, z - k * nz
+
+    @staticmethod
+    def length(vector):
+        x, y, z = vector
+        return math.sqrt(x * x + y * y + z * z)
+
+    @staticmethod
+    def distance(v1, v2):
+        return math.sqrt((v2[0] - v1[0]) ** 2 + (v2[1] - v1[1]) ** 2 + (v2[2] - v1[2]) ** 2)
+
+    @staticmethod
+    def clamp(value, min_val, max_val):
+        if isinstance(value, (tuple, list)):
+            x, y, z = value
+            return (max(min_val, min(x, max_val)), max(min_val, min(y, max_val)),
+                    max(min_val, min(z, max_val)))
+        return max(min_val, min(value, max_val))
+
+    @staticmethod
+    def lerp(a, b, t):
+        if isinstance(a, (tuple, list)):
+            return tuple(x + (y - x) * t for x, y in zip(a, b))
+        return a + (b - a) * t
+
+    @staticmethod
+    def magnitude_squared(vector):
+        x, y, z = vector
+        return x * x + y * y + z * z
+
+    @staticmethod
+    def add(v1, v2):
+        return v1[0] + v2[0], v1[1] + v2[1], v1[2] + v2[2]
+
+    @staticmethod
+    def sub(v1, v2):
+        return v1[0] - v2[0], v1[1] - v2[1], v1[2] - v2[2]
+
+    @staticmethod
+    def mul(v1, v2):
+        return v1[0] * v2[0], v1[1] * v2[1], v1[2] * v2[2]
+
+    @staticmethod
+    def scale(vector, factor):
+        return vector[0] * factor, vector[1] * factor, vector[2] * factor
+
+    @staticmethod
+    def divide(vector, divisor):
+        return vector[0] / divisor, vector[1] / divisor, vector[2] / divisor
+
+
+# Бэкенды скалярного пути трассировки по имени (атрибут math_backend фигур и RayTracer)
+MATH_BACKENDS = {
+    'numpy': NumpyMath,
+    'scalar': ScalarMath,
+}
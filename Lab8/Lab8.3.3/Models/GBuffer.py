@@ -0,0 +1,42 @@
+import numpy as np
+from Models.IntersectionBatch import IntersectionBatch
+
+
+class GBuffer:
+    """Данные кадра для повторного затенения пикселей без лучей тени.
+
+    Для каждого пикселя хранит первичное пересечение (hits), точку, из которой
+    бросались лучи тени (sample_point), координаты сэмплов на площадке
+    источника (light_uv), их видимость (visible) и число сэмплов (taken).
+    Занимает около width * height * samples * 17 байт.
+    """
+
+    def __init__(self, width, height, max_samples):
+        count = width * height
+        self.width = width
+        self.height = height
+        self.hits = IntersectionBatch(count)
+        self.sample_point = np.zeros((count, 3))
+        self.light_uv = np.zeros((count, max_samples, 2))
+        self.visible = np.zeros((count, max_samples), dtype=bool)
+        self.taken = np.zeros(count, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.taken)
+
+    @property
+    def max_samples(self):
+        return self.visible.shape[1]
+
+    def store_samples(self, pixels, start, uv, visible):
+        """Записывает серию сэмплов (N, samples) пикселей pixels начиная с номера start"""
+        end = start + uv.shape[1]
+        self.light_uv[pixels, start:end] = uv
+        self.visible[pixels, start:end] = visible
+
+    def copy_samples(self, other, pixels, sources):
+        """Переносит сэмплы источника из пикселей sources буфера other в пиксели pixels"""
+        self.sample_point[pixels] = other.sample_point[sources]
+        self.light_uv[pixels] = other.light_uv[sources]
+        self.visible[pixels] = other.visible[sources]
+        self.taken[pixels] = other.taken[sources]
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class IntersectionBatch:
+    """Пакет результатов пересечения для N лучей (аналог IntersectionResult)"""
+
+    def __init__(self, count):
+        self.distance = np.full(count, np.inf)
+        self.point = np.zeros((count, 3))
+        self.normal = np.zeros((count, 3))
+        self.color = np.ones((count, 3))
+        self.shape_index = np.full(count, -1, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.distance)
+
+    def assign(self, part, other):
+        """Записывает результаты other в срез part этого пакета"""
+        self.distance[part] = other.distance
+        self.point[part] = other.point
+        self.normal[part] = other.normal
+        self.color[part] = other.color
+        self.shape_index[part] = other.shape_index
+
+    def take(self, indices):
+        """Новый пакет из результатов с индексами indices"""
+        batch = IntersectionBatch(0)
+        batch.distance = self.distance[indices]
+        batch.point = self.point[indices]
+        batch.normal = self.normal[indices]
+        batch.color = self.color[indices]
+        batch.shape_index = self.shape_index[indices]
+        return batch
+
+    def is_valid(self):
+        """Маска лучей, у которых было пересечение"""
+        return np.isfinite(self.distance)
+
+    def merge(self, other, shape_index):
+        """Забирает из other пересечения, которые ближе уже найденных"""
+        closer = other.distance < self.distance
+        if not np.any(closer):
+            return
+        self.distance[closer] = other.distance[closer]
+        self.point[closer] = other.point[closer]
+        self.normal[closer] = other.normal[closer]
+        self.color[closer] = other.color[closer]
+        self.shape_index[closer] = shape_index
+
+    def merge_at(self, other, rays, shape_index):
+        """Как merge, но other содержит результаты только для лучей с индексами rays"""
+        closer = other.distance < self.distance[rays]
+        if not np.any(closer):
+            return
+        target = rays[closer]
+        self.distance[target] = other.distance[closer]
+        self.point[target] = other.point[closer]
+        self.normal[target] = other.normal[closer]
+        self.color[target] = other.color[closer]
+        self.shape_index[target] = shape_index
@@ -5,15 +5,23 @@ if TYPE_CHECKING:
     from Models.Material import Material
     from Shapes.Interfaces.IShape import IShape
 
+# Общие значения по умолчанию, только для чтения
+_ZERO = np.zeros(3, dtype=np.float32)
+_ZERO.setflags(write=False)
+_ONE = np.ones(3, dtype=np.float32)
+_ONE.setflags(write=False)
+
 
 class IntersectionResult:
-    def __init__(self):
-        self.point = np.zeros(3, dtype=np.float32)
-        self.distance = float('inf')
-        self.normal = np.zeros(3, dtype=np.float32)
-        self.color = np.ones(3, dtype=np.float32)
-        self.material = None  # type: Material
-        self.shape = None  # type: IShape
+    __slots__ = ('point', 'distance', 'normal', 'color', 'material', 'shape')
+
+    def __init__(self, point=_ZERO, distance=float('inf'), normal=_ZERO, color=_ONE, material=None, shape=None):
+        self.point = point
+        self.distance = distance
+        self.normal = normal
+        self.color = color
+        self.material = material  # type: Material
+        self.shape = shape  # type: IShape
 
     def is_valid(self):
         """Проверяет, было ли пересечение"""
@@ -21,4 +29,18 @@ class IntersectionResult:
 
     # Для обратной совместимости можно оставить __bool__, но возвращать обычный bool
     def __bool__(self):
-        return bool(self.is_valid())
\ No newline at end of file
+        return bool(self.is_valid())
+
+
+class _NoHit(IntersectionResult):
+    """Неизменяемый результат "пересечения нет", общий для всех промахов"""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("NO_HIT is shared and cannot be modified")
+
+
+NO_HIT = _NoHit.__new__(_NoHit)
+_empty = IntersectionResult()
+for _name in IntersectionResult.__slots__:
+    object.__setattr__(NO_HIT, _name, getattr(_empty, _name))
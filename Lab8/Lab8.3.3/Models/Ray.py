@@ -2,6 +2,8 @@ import numpy as np
 
 
 class Ray:
+    __slots__ = ('origin', 'direction')
+
     def __init__(self, origin=None, direction=None):
         self.origin = origin if origin is not None else np.zeros(3, dtype=np.float32)
         self.direction = direction if direction is not None else np.zeros(3, dtype=np.float32)
@@ -10,6 +12,14 @@ class Ray:
         if np.any(self.direction):
             self.direction = self.direction / np.linalg.norm(self.direction)
 
+    @classmethod
+    def normalized(cls, origin, direction):
+        """Луч с уже нормализованным direction: без проверки и повторной нормализации"""
+        ray = cls.__new__(cls)
+        ray.origin = origin
+        ray.direction = direction
+        return ray
+
     def at(self, t):
         """Возвращает точку на луче на расстоянии t от origin"""
         return self.origin + self.direction * t
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+class RenderLayers:
+    """Слои кадра, в которых видимость источника отделена от остального освещения.
+
+    direct - прямое освещение без учета препятствий, ambient - фоновая
+    добавка освещенного пикселя, shadow - цвет пикселя в полной тени (для
+    промахов - цвет фона), visibility - доля видимых сэмплов источника.
+    depth, normal и shape_index - первичные пересечения для фильтров.
+    Все массивы размером (height, width, ...).
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.direct = np.zeros((height, width, 3))
+        self.ambient = np.zeros((height, width, 3))
+        self.shadow = np.zeros((height, width, 3))
+        self.visibility = np.zeros((height, width))
+        self.depth = np.full((height, width), np.inf)
+        self.normal = np.zeros((height, width, 3))
+        self.shape_index = np.full((height, width), -1, dtype=np.int64)
+
+    def compose(self, visibility=None, min_visibility=0.0):
+        """Итоговое изображение (h, w, 3) с видимостью visibility (по умолчанию своей).
+
+        Пиксели с видимостью не больше min_visibility считаются в полной тени.
+        """
+        visibility = self.visibility if visibility is None else visibility
+        lit = np.clip(self.direct * visibility[..., None] + self.ambient, 0, 1)
+        in_shadow = (visibility <= min_visibility)[..., None]
+        return np.where(in_shadow, self.shadow, lit)
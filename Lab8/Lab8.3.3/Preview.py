@@ -0,0 +1,205 @@
+import copy
+import math
+import time
+import numpy as np
+import pygame
+from MathUtils import normalize, rotation_matrix
+
+# Наименьший угол между направлением взгляда и вектором up камеры (радианы)
+MIN_PITCH_ANGLE = math.radians(5)
+
+
+class ResolutionController:
+    """Подбирает масштаб разрешения превью, чтобы держать целевое время кадра.
+
+    Время кадра пропорционально числу пикселей, то есть квадрату масштаба,
+    поэтому масштаб меняется на корень из отношения времен; шаг ограничен
+    max_step, чтобы один медленный кадр не обрушивал разрешение.
+    """
+
+    def __init__(self, target_frame_time=1 / 15, min_scale=0.1, max_scale=0.5, scale=0.25, max_step=1.5):
+        self.target_frame_time = target_frame_time
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale = scale
+        self.max_step = max_step
+
+    def update(self, frame_time):
+        """Учитывает время последнего кадра превью и возвращает новый масштаб"""
+        ratio = math.sqrt(self.target_frame_time / max(frame_time, 1e-6))
+        ratio = min(max(ratio, 1 / self.max_step), self.max_step)
+        self.scale = min(max(self.scale * ratio, self.min_scale), self.max_scale)
+        return self.scale
+
+
+class CameraController:
+    """Управление камерой: WASD - движение, Q/E - вниз/вверх, мышь с левой кнопкой - поворот.
+
+    Вектор up камеры не меняется: он задает вертикаль, вокруг которой
+    поворачивается взгляд, и по-прежнему не ортогонализуется к нему.
+    """
+
+    def __init__(self, speed=2.0, sensitivity=0.005):
+        self.speed = speed  # Единиц сцены в секунду
+        self.sensitivity = sensitivity  # Радиан на пиксель движения мыши
+
+    def update(self, camera, dt):
+        """Сдвигает и поворачивает camera по нажатым клавишам и мыши, возвращает True, если она изменилась"""
+        keys = pygame.key.get_pressed()
+        dx, dy = pygame.mouse.get_rel()
+        dragging = pygame.mouse.get_pressed()[0] and (dx or dy)
+
+        up = normalize(np.asarray(camera.up, dtype=np.float64))
+        forward = np.asarray(camera.forward, dtype=np.float64)
+        right = np.asarray(camera.right, dtype=np.float64)
+        # По горизонтали двигаемся в плоскости, перпендикулярной up
+        ahead = normalize(forward - up * np.dot(forward, up))
+
+        step = np.zeros(3)
+        for key, direction in ((pygame.K_w, ahead), (pygame.K_s, -ahead), (pygame.K_d, right),
+                               (pygame.K_a, -right), (pygame.K_e, up), (pygame.K_q, -up)):
+            if keys[key]:
+                step += direction
+
+        if not np.any(step) and not dragging:
+            return False
+
+        if dragging:
+            forward = self._rotate(forward, up, right, -dx * self.sensitivity, -dy * self.sensitivity)
+
+        position = np.asarray(camera.position, dtype=np.float64)
+        if np.any(step):
+            position = position + normalize(step) * self.speed * dt
+        distance = np.linalg.norm(np.asarray(camera.look_at, dtype=np.float64) - camera.position)
+
+        camera.position = position.astype(np.float32)
+        camera.look_at = (position + forward * distance).astype(np.float32)
+        return True
+
+    @staticmethod
+    def _rotate(forward, up, right, yaw, pitch):
+        """Поворачивает направление взгляда на yaw вокруг up и на pitch вокруг right"""
+        # Не даем взгляду подойти к up вплотную: иначе right вырождается
+        angle = math.acos(min(max(np.dot(forward, up), -1.0), 1.0))
+        pitch = min(max(pitch, angle - (math.pi - MIN_PITCH_ANGLE)), angle - MIN_PITCH_ANGLE)
+
+        forward = rotation_matrix(right, pitch)[:3, :3] @ forward
+        forward = rotation_matrix(up, yaw)[:3, :3] @ forward
+        return normalize(forward)
+
+
+class InteractivePreview:
+    """Интерактивный режим окна: превью при движении камеры и дорендер в покое.
+
+    Пока камера движется, кадр рендерится в уменьшенном разрешении (масштаб
+    подбирает ResolutionController) с одним сэмплом источника и растягивается
+    на окно. Через settle_time секунд покоя запускается render_progressive в
+    полном разрешении; его тайлы рисуются поверх превью между опросами событий,
+    а новое движение камеры прерывает его.
+    """
+
+    def __init__(self, tracer, screen, target_frame_time=1 / 15, settle_time=0.3, tile_size=32, workers=None):
+        self.tracer = tracer
+        self.screen = screen
+        self.settle_time = settle_time
+        self.tile_size = tile_size
+        self.workers = workers
+        self.camera_controller = CameraController()
+        self.resolution = ResolutionController(target_frame_time)
+        self.image = pygame.Surface((tracer.width, tracer.height))
+        self._preview_scene = _one_sample_scene(tracer.scene)
+        self._refinement = None
+
+    def run(self):
+        """Главный цикл; возвращает управление, когда окно закрыто или нажат Esc"""
+        clock = pygame.time.Clock()
+        last_move = time.perf_counter()
+        refined = False
+        self.render_preview()
+
+        try:
+            while True:
+                dt = clock.tick() / 1000.0
+                if self._refinement is not None or not refined:
+                    events = pygame.event.get()
+                else:
+                    # Кадр готов: ждем событий, не нагружая процессор
+                    events = [pygame.event.wait(50)]
+
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        return
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                        return
+                    if event.type == pygame.MOUSEBUTTONDOWN:
+                        pygame.mouse.get_rel()  # Начало перетаскивания: сбрасываем накопленный сдвиг
+                    if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                        self._show()
+
+                if self.camera_controller.update(self.tracer.camera, dt):
+                    self._stop_refinement()
+                    self.render_preview()
+                    last_move = time.perf_counter()
+                    refined = False
+                elif not refined and self._refinement is None:
+                    if time.perf_counter() - last_move >= self.settle_time:
+                        self._refinement = self.tracer.render_progressive(
+                            self.image, self.tile_size, self.workers, preview_step=1)
+                elif self._refinement is not None:
+                    refined = self._refine_step()
+        finally:
+            self._stop_refinement()
+
+    def render_preview(self):
+        """Рендерит и показывает кадр в уменьшенном разрешении, подстраивая масштаб"""
+        start = time.perf_counter()
+        tracer = self.tracer
+        scale = self.resolution.scale
+
+        preview = copy.copy(tracer)
+        preview.width = max(1, round(tracer.width * scale))
+        preview.height = max(1, round(tracer.height * scale))
+        preview.scene = self._preview_scene
+        preview.stats = None
+        preview.visibility_cache = None  # Видимость по одному сэмплу не должна попасть в общий кеш
+
+        image = preview._render_region(0, 0, preview.width, preview.height, np.random.default_rng())
+        pygame.transform.scale(preview._to_surface(image), (tracer.width, tracer.height), self.image)
+        self._show()
+        self.resolution.update(time.perf_counter() - start)
+
+    def _refine_step(self):
+        """Рисует следующую готовую часть полного рендера, возвращает True, когда он закончен"""
+        try:
+            rect = next(self._refinement)
+        except StopIteration:
+            self._refinement = None
+            return True
+
+        self.screen.blit(self.image, rect, rect)
+        pygame.display.update(rect)
+        return False
+
+    def _stop_refinement(self):
+        # Закрытие генератора останавливает пул процессов render_progressive
+        if self._refinement is not None:
+            self._refinement.close()
+            self._refinement = None
+
+    def _show(self):
+        self.screen.blit(self.image, (0, 0))
+        pygame.display.flip()
+
+
+def _one_sample_scene(scene):
+    """Копия сцены с теми же фигурами и одним сэмплом на каждый источник света"""
+    preview = copy.copy(scene)
+    preview.lights = []
+    for light in scene.lights:
+        light = copy.copy(light)
+        light.samples = 1
+        light.max_samples = 1
+        light.min_samples = 1
+        light.adaptive = False
+        preview.lights.append(light)
+    return preview
@@ -0,0 +1,190 @@
+import numpy as np
+import math
+
+# Порог, ниже которого депрессивная кварта считается биквадратной
+BIQUADRATIC_EPSILON = 1e-10
+
+
+def solve_quartic(a, b, c, d, e, polish_iterations=2, stats=None):
+    """Вещественные корни a*t^4 + b*t^3 + c*t^2 + d*t + e = 0 (метод Феррари).
+
+    Корни уточняются polish_iterations шагами Ньютона по исходному многочлену;
+    если передан RenderStats stats, в нем считаются решения и шаги уточнения.
+    """
+    if stats is not None:
+        stats.count('quartic_solves')
+
+    if a == 0:
+        return _solve_cubic(b, c, d, e)
+
+    b, c, d, e = b / a, c / a, d / a, e / a
+
+    # Подстановка t = y - b/4 дает y^4 + p*y^2 + q*y + r = 0
+    b2 = b * b
+    p = c - 0.375 * b2
+    q = d - 0.5 * b * c + 0.125 * b2 * b
+    r = e - 0.25 * b * d + 0.0625 * b2 * c - 0.01171875 * b2 * b2
+    shift = -0.25 * b
+
+    if abs(q) < BIQUADRATIC_EPSILON:
+        ys = []
+        for z in _solve_quadratic(1.0, p, r):
+            if z >= 0:
+                root = math.sqrt(z)
+                ys.extend((root, -root))
+    else:
+        # Наибольший корень резольвенты m^3 + p*m^2 + (p^2/4 - r)*m - q^2/8 = 0
+        m = _largest_cubic_root(p, 0.25 * p * p - r, -0.125 * q * q)
+        if m <= 0:
+            m = BIQUADRATIC_EPSILON
+        s = math.sqrt(2 * m)
+        half = 0.5 * p + m
+        ys = _solve_quadratic(1.0, -s, half + q / (2 * s)) + _solve_quadratic(1.0, s, half - q / (2 * s))
+
+    roots = []
+    refinements = 0
+    for y in ys:
+        root, iterations = _polish_root(1.0, b, c, d, e, y + shift, polish_iterations)
+        roots.append(root)
+        refinements += iterations
+
+    if stats is not None:
+        stats.count('root_refinements', refinements)
+    return roots
+
+
+def solve_quartic_many(a, b, c, d, e, polish_iterations=2, stats=None):
+    """Пакетная версия solve_quartic для массивов коэффициентов длины N.
+
+    Возвращает массив (N, 4) корней; отсутствующие корни равны nan.
+    Старший коэффициент a должен быть ненулевым.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b, c, d, e = b / a, c / a, d / a, e / a
+
+        b2 = b * b
+        p = c - 0.375 * b2
+        q = d - 0.5 * b * c + 0.125 * b2 * b
+        r = e - 0.25 * b * d + 0.0625 * b2 * c - 0.01171875 * b2 * b2
+        shift = -0.25 * b
+
+        ys = np.full((len(a), 4), np.nan)
+
+        # Биквадратный случай
+        biquadratic = np.abs(q) < BIQUADRATIC_EPSILON
+        z = _solve_quadratic_many(np.ones_like(p), p, r)
+        z = np.where(z >= 0, z, np.nan)
+        root = np.sqrt(z)
+        ys[biquadratic] = np.concatenate([root, -root], axis=1)[biquadratic]
+
+        # Общий случай через резольвенту
+        general = ~biquadratic
+        m = _largest_cubic_root_many(p, 0.25 * p * p - r, -0.125 * q * q)
+        m = np.where(m > 0, m, BIQUADRATIC_EPSILON)
+        s = np.sqrt(2 * m)
+        half = 0.5 * p + m
+        ones = np.ones_like(p)
+        pairs = np.concatenate([_solve_quadratic_many(ones, -s, half + q / (2 * s)),
+                                _solve_quadratic_many(ones, s, half - q / (2 * s))], axis=1)
+        ys[general] = pairs[general]
+
+        roots = ys + shift[:, None]
+        coefficients = [x[:, None] for x in (np.ones_like(b), b, c, d, e)]
+        for i in range(polish_iterations):
+            value, derivative = _evaluate_with_derivative(*coefficients, roots)
+            step = np.where(derivative != 0, value / derivative, 0)
+            roots = roots - step
+
+    if stats is not None:
+        stats.count('quartic_solves', len(a))
+        stats.count('root_refinements', np.count_nonzero(np.isfinite(roots)) * polish_iterations)
+    return roots
+
+
+def _solve_quadratic(a, b, c):
+    """Вещественные корни квадратного уравнения (устойчивая формула)"""
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return []
+
+    root = math.sqrt(discriminant)
+    q = -0.5 * (b + math.copysign(root, b))
+    if q == 0:
+        return [0.0, 0.0]
+    return [q / a, c / q]
+
+
+def _solve_quadratic_many(a, b, c):
+    """Пакетная версия _solve_quadratic, результат (N, 2) с nan вместо корней"""
+    discriminant = b * b - 4 * a * c
+    root = np.sqrt(np.where(discriminant >= 0, discriminant, np.nan))
+    q = -0.5 * (b + np.copysign(root, b))
+    first = np.where(q != 0, q / a, 0.0)
+    second = np.where(q != 0, c / q, 0.0)
+    return np.stack([first, second], axis=1)
+
+
+def _largest_cubic_root(a, b, c):
+    """Наибольший вещественный корень x^3 + a*x^2 + b*x + c = 0 (Кардано)"""
+    Q = (a * a - 3 * b) / 9
+    R = (2 * a * a * a - 9 * a * b + 27 * c) / 54
+    Q3 = Q * Q * Q
+
+    if R * R < Q3:
+        theta = math.acos(R / math.sqrt(Q3))
+        return -2 * math.sqrt(Q) * math.cos((theta + 2 * math.pi) / 3) - a / 3
+
+    A = -math.copysign((abs(R) + math.sqrt(R * R - Q3)) ** (1 / 3), R)
+    B = Q / A if A != 0 else 0.0
+    return A + B - a / 3
+
+
+def _largest_cubic_root_many(a, b, c):
+    """Пакетная версия _largest_cubic_root"""
+    Q = (a * a - 3 * b) / 9
+    R = (2 * a * a * a - 9 * a * b + 27 * c) / 54
+    Q3 = Q * Q * Q
+    three_real = R * R < Q3
+
+    theta = np.arccos(np.clip(R / np.sqrt(np.where(three_real, Q3, 1.0)), -1, 1))
+    trigonometric = -2 * np.sqrt(np.maximum(Q, 0)) * np.cos((theta + 2 * np.pi) / 3) - a / 3
+
+    A = -np.copysign(np.cbrt(np.abs(R) + np.sqrt(np.maximum(R * R - Q3, 0))), R)
+    B = np.where(A != 0, Q / A, 0.0)
+    cardano = A + B - a / 3
+
+    return np.where(three_real, trigonometric, cardano)
+
+
+def _solve_cubic(a, b, c, d):
+    """Вещественные корни вырожденной кварты (a*t^3 + b*t^2 + c*t + d)"""
+    if a == 0:
+        if b == 0:
+            return [-d / c] if c != 0 else []
+        return _solve_quadratic(b, c, d)
+
+    root = _largest_cubic_root(b / a, c / a, d / a)
+    # Делим многочлен на (t - root) по схеме Горнера
+    qb = b + a * root
+    qc = c + qb * root
+    return [root] + _solve_quadratic(a, qb, qc)
+
+
+def _polish_root(a, b, c, d, e, t, iterations):
+    """Уточняет корень методом Ньютона, возвращает (корень, число сделанных шагов)"""
+    for i in range(iterations):
+        value, derivative = _evaluate_with_derivative(a, b, c, d, e, t)
+        if derivative == 0:
+            return t, i
+        t -= value / derivative
+    return t, iterations
+
+
+def _evaluate_with_derivative(a, b, c, d, e, t):
+    """Значение многочлена и его производной в точке t по схеме Горнера"""
+    value = a
+    derivative = 0
+    for coefficient in (b, c, d, e):
+        derivative = derivative * t + value
+        value = value * t + coefficient
+    return value, derivative
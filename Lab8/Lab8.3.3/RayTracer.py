@@ -1,14 +1,28 @@
+import copy
 import numpy as np
 import pygame
 import math
+import os
+import pickle
+import signal
+from multiprocessing import Pool
 from Models.Ray import Ray
 from Models.IntersectionResult import IntersectionResult
+from Models.IntersectionBatch import IntersectionBatch
+from Models.GBuffer import GBuffer
+from Models.RenderLayers import RenderLayers
 from Models.Material import Material
 from Scene import Scene
+from Camera import Camera
+from Animation import SequenceRenderer
+from Antialiasing import SUBPIXEL_OFFSETS, edge_contrast, select_pixels
 from AreaLight import AreaLight
+from Denoising import denoise_visibility
+from RenderCache import fingerprint
+from RenderStats import RenderStats, ProgressReporter
 from Shapes.ChessBoard import InfinityChessBoard
 from Shapes.Torus import Torus
-from MathUtils import dot, normalize, reflect, length, distance, clamp, vector3
+from MathUtils import clamp, vector3, MATH_BACKENDS
 
 
 class RayTracer:
@@ -16,7 +30,26 @@ class RayTracer:
         self.width = width
         self.height = height
         self.max_depth = 2
+        self.batch_size = 2048  # Пикселей в одном пакете для render_batched
+        self.background = vector3(0.3, 0.4, 0.5)
+        self.camera = Camera()
         self.scene = self._create_scene()
+        self.cache = None  # RenderCache: готовые кадры берутся с диска, если ничего не менялось
+        self.stats = None  # RenderStats, включается через enable_stats()
+        self.progress_callback = None  # callback(done, total) с числом готовых пикселей
+        self.progress_interval = 0.5  # Не чаще одного вызова progress_callback за столько секунд
+        self.math_backend = 'numpy'  # Бэкенд MathUtils скалярного трассировщика, см. set_math_backend
+        self._gbuffer = None  # G-буфер последнего render_relightable_image и ключи его актуальности
+        self._gbuffer_geometry = None
+        self._gbuffer_lights = None
+        self.visibility_cache = None  # VisibilityCache: доля видимых сэмплов по ячейкам мировой сетки
+
+    def __getstate__(self):
+        # G-буфер процессам пула не нужен, прогресс сообщает только родительский процесс
+        state = self.__dict__.copy()
+        state['_gbuffer'] = None
+        state['progress_callback'] = None
+        return state
 
     def _create_scene(self):
         """Создает сцену с тором и шахматной доской"""
@@ -68,14 +101,48 @@ class RayTracer:
 
         return scene
 
+    def enable_stats(self):
+        """Включает сбор статистики рендера и возвращает объект RenderStats"""
+        self.stats = RenderStats()
+        self.scene.attach_stats(self.stats)
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+        self.scene.attach_stats(None)
+
+    def set_math_backend(self, name):
+        """Переключает скалярный трассировщик и фигуры сцены на бэкенд MathUtils ('numpy' или 'scalar')"""
+        if name not in MATH_BACKENDS:
+            raise ValueError(f"Unknown math backend: {name}")
+        self.math_backend = name
+        for shape in self.scene.shapes:
+            shape.math_backend = name
+
     def render(self):
         """Рендерит сцену и возвращает Surface Pygame"""
+        return self._cached(('scalar', self.math_backend), self._render_scalar)
+
+    def _render_scalar(self):
+        """Попиксельный рендер скалярным трассировщиком"""
         surface = pygame.Surface((self.width, self.height))
         pixels = pygame.surfarray.pixels3d(surface)
 
-        camera_pos = vector3(0, 1, 3)
+        m = MATH_BACKENDS[self.math_backend]
+        camera_pos = m.convert(self.camera.position)
+        forward = m.convert(self.camera.forward)
+        right = m.convert(self.camera.right)
+        up = m.convert(self.camera.up)
         total_pixels = self.width * self.height
         rendered_pixels = 0
+        stats = self.stats
+        progress = ProgressReporter(self.progress_callback, total_pixels, self.progress_interval)
+
+        if self.visibility_cache is not None:
+            self.visibility_cache.validate(self.scene)
+        if stats is not None:
+            stats.count('primary_rays', total_pixels)
+            stats.start_lap()
 
         for y in range(self.height):
             for x in range(self.width):
@@ -83,18 +150,21 @@ class RayTracer:
                 ndc_x = (2.0 * x / self.width) - 1.0
                 ndc_y = 1.0 - (2.0 * y / self.height)
 
-                # Направление луча через пиксель
-                look_at = vector3(0, 0, -5)
-                forward = normalize(look_at - camera_pos)
-                right = vector3(1, 0, 0)
-                up = vector3(0, 1, 0)
-
-                ray_dir = normalize(forward + right * ndc_x + up * ndc_y)
+                # Направление луча через пиксель (как Camera.ray_direction)
+                ray_dir = m.normalize(m.add(m.add(forward, m.scale(right, ndc_x)), m.scale(up, ndc_y)))
 
                 # Луч
-                ray = Ray(camera_pos, ray_dir)
+                ray = Ray.normalized(camera_pos, ray_dir)
+                if stats is not None:
+                    stats.lap('ray_generation')
+
+                intersection = self.scene.intersect(ray)
+                if stats is not None:
+                    stats.lap('intersection')
 
-                color = self._trace_ray(ray)
+                color = self._shade(ray, intersection)
+                if stats is not None:
+                    stats.lap('shading')
 
                 # Конвертируем в 0-255 и записываем в пиксель
                 pixels[x, y] = (
@@ -102,82 +172,768 @@ class RayTracer:
                     int(clamp(color[1], 0, 1) * 255),
                     int(clamp(color[2], 0, 1) * 255)
                 )
+                if stats is not None:
+                    stats.lap('pixel_write')
 
                 rendered_pixels += 1
-                if rendered_pixels % 1000 == 0:
-                    progress = (rendered_pixels / total_pixels) * 100
-                    print(f"Rendered {rendered_pixels}/{total_pixels} pixels ({progress:.1f}%)")
+                progress.update(rendered_pixels)
 
         return surface
 
-    def _trace_ray(self, ray: Ray, depth: int = 0) -> np.ndarray:
-        """Трассирует луч и возвращает цвет"""
-        if depth > 1:
-            return vector3(0, 0, 0)  # Черный цвет для глубокой рекурсии
+    def render_batched(self, seed=None):
+        """Рендерит сцену пакетами лучей на NumPy и возвращает Surface Pygame"""
+        def render():
+            rng = np.random.default_rng(seed)
+            return self._to_surface(self._render_region(0, 0, self.width, self.height, rng))
 
-        intersection = self.scene.intersect(ray)
+        return self._cached(('batched', seed, self.batch_size), render)
 
-        # Фоновый цвет
-        if not intersection.is_valid():  # Используем is_valid() вместо bool
-            return vector3(0.3, 0.4, 0.5)  # Сине-голубой фон
+    def render_tiled(self, tile_size=32, workers=None, seed=0):
+        """Рендерит сцену тайлами в пуле процессов и возвращает Surface Pygame"""
+        def render():
+            return self._to_surface(self.render_image(tile_size, workers, seed))
+
+        # Число процессов на картинку не влияет и в ключ не входит
+        return self._cached(('tiled', tile_size, seed, self.batch_size), render)
+
+    def render_image(self, tile_size=32, workers=None, seed=0):
+        """Как render_tiled, но возвращает float-изображение (h, w, 3) без Pygame"""
+        image = np.zeros((self.height, self.width, 3))
+
+        for x0, y0, tile in self.iter_tiles(tile_size, workers, seed):
+            image[y0:y0 + tile.shape[0], x0:x0 + tile.shape[1]] = tile
+
+        return image
+
+    def _cached(self, settings, render):
+        """Вызывает render() или берет готовый кадр из self.cache.
+
+        Ключ включает сцену, камеру, размер кадра и настройки режима settings.
+        С visibility_cache кадр зависит от предыдущих рендеров и не кешируется.
+        """
+        if self.cache is None or self.visibility_cache is not None:
+            return render()
+
+        key = self.cache.key(self.scene, self.camera, self.width, self.height, self.background, settings)
+        pixels = self.cache.load(key)
+        if pixels is not None:
+            surface = pygame.Surface((self.width, self.height))
+            pygame.surfarray.blit_array(surface, pixels)
+            return surface
+
+        surface = render()
+        self.cache.store(key, pygame.surfarray.array3d(surface))
+        return surface
 
-        result = intersection
-        material = result.material
+    def iter_tiles(self, tile_size=32, workers=None, seed=0):
+        """Отдает готовые тайлы (x0, y0, изображение тайла) по мере их завершения.
+
+        Каждый тайл использует собственный генератор, зависящий только от seed и
+        положения тайла, поэтому результат не зависит от числа процессов.
+        Процессы получают текущий visibility_cache, а его пополнения приходят
+        обратно с тайлами и сливаются в кеш этого трассировщика.
+        """
+        tiles = self._tiles(tile_size, seed)
+        workers = workers or os.cpu_count() or 1
+        progress = ProgressReporter(self.progress_callback, self.width * self.height, self.progress_interval)
+        done = 0
+        if self.visibility_cache is not None:
+            # Устаревший кеш очищается до отправки процессам, иначе их пополнения в нем смешаются
+            self.visibility_cache.validate(self.scene)
+
+        def collect(result):
+            # Статистика и пополнения кеша видимости из процессов пула сливаются в этот трассировщик
+            nonlocal done
+            x0, y0, tile, tile_stats, tile_cache = result
+            if self.stats is not None:
+                self.stats.merge(tile_stats)
+            if self.visibility_cache is not None:
+                self.visibility_cache.merge(tile_cache)
+            done += tile.shape[0] * tile.shape[1]
+            progress.update(done)
+            return x0, y0, tile
+
+        if workers == 1:
+            _init_tile_worker(pickle.dumps(self))
+            for tile in tiles:
+                yield collect(_render_tile(tile))
+            return
+
+        # Трассировщик со сценой сериализуется один раз на процесс, а не на тайл
+        with Pool(workers, initializer=_init_pool_worker, initargs=(pickle.dumps(self),)) as pool:
+            for result in pool.imap_unordered(_render_tile, tiles):
+                yield collect(result)
+
+    def _tiles(self, tile_size, seed):
+        """Задания тайлов (x0, y0, x1, y1, seed) для _render_tile"""
+        return [(x0, y0, min(x0 + tile_size, self.width), min(y0 + tile_size, self.height), seed)
+                for y0 in range(0, self.height, tile_size)
+                for x0 in range(0, self.width, tile_size)]
+
+    def render_progressive(self, surface, tile_size=32, workers=None, seed=0, preview_step=8):
+        """Рендерит сцену в surface по частям, отдавая pygame.Rect обновленной области.
+
+        Сначала быстрый грубый проход (один луч на блок preview_step x preview_step),
+        затем готовые тайлы по мере их завершения поверх него.
+        """
+        if preview_step > 1:
+            rng = np.random.default_rng((seed, self.width, self.height))
+            ys, xs = np.mgrid[0:self.height:preview_step, 0:self.width:preview_step]
+            coarse = self._render_pixels(xs.ravel(), ys.ravel(), rng).reshape(xs.shape + (3,))
+            preview = np.repeat(np.repeat(coarse, preview_step, axis=0), preview_step, axis=1)
+            surface.blit(self._to_surface(preview[:self.height, :self.width]), (0, 0))
+            yield surface.get_rect()
+
+        for x0, y0, tile in self.iter_tiles(tile_size, workers, seed):
+            yield surface.blit(self._to_surface(tile), (x0, y0))
+
+    def render_sequence(self, frames, seed=0):
+        """Рендерит последовательность кадров Animation.Frame, отдавая float-изображения (h, w, 3).
+
+        Видимость источника в пикселях, которые не могли измениться, берется
+        из предыдущего кадра (см. Animation.SequenceRenderer).
+        """
+        return SequenceRenderer(self).render(frames, seed)
+
+    def render_antialiased(self, seed=0, subsamples=4, budget=0.1,
+                           color_threshold=0.1, depth_threshold=0.05):
+        """Рендерит сцену с адаптивным сглаживанием и возвращает Surface Pygame.
+
+        После первого прохода находит пиксели с разрывами цвета, глубины или
+        фигуры и бросает в них subsamples дополнительных подпиксельных лучей.
+        budget - наибольшая доля пикселей кадра, которые можно уточнить.
+        """
+        def render():
+            return self._to_surface(self.render_antialiased_image(
+                seed, subsamples, budget, color_threshold, depth_threshold))
+
+        settings = ('antialiased', seed, subsamples, budget, color_threshold, depth_threshold, self.batch_size)
+        return self._cached(settings, render)
+
+    def render_relightable(self, seed=0):
+        """Рендерит сцену с сохранением G-буфера и возвращает Surface Pygame (см. render_relightable_image)"""
+        return self._to_surface(self.render_relightable_image(seed))
+
+    def render_relightable_image(self, seed=0):
+        """Как render_batched, но хранит G-буфер кадра и возвращает float-изображение (h, w, 3).
+
+        Если с прошлого вызова менялись только источники света, первичные лучи
+        не трассируются: затенение и лучи тени считаются по G-буферу. Если
+        менялись только материалы, цвета источников или фона, не бросаются и
+        лучи тени - видимость сэмплов тоже берется из G-буфера.
+        """
+        rng = np.random.default_rng(seed)
+        count = self.width * self.height
+        ys, xs = np.mgrid[0:self.height, 0:self.width]
+        xs, ys = xs.ravel(), ys.ravel()
+        light = self.scene.lights[0] if self.scene.lights else None
+        max_samples = light.table_size() if light else 0
+
+        geometry = self._geometry_key()
+        lights = self._visibility_key()
+        gbuffer = self._gbuffer
+        if gbuffer is None or self._gbuffer_geometry != geometry:
+            gbuffer = GBuffer(self.width, self.height, max_samples)
+            self._trace_primary(xs, ys, gbuffer.hits)
+            self._gbuffer_lights = None
+        elif gbuffer.max_samples != max_samples:
+            hits = gbuffer.hits
+            gbuffer = GBuffer(self.width, self.height, max_samples)
+            gbuffer.hits = hits
+
+        colors = np.empty((count, 3))
+        reshade = self._gbuffer_lights == lights
+        for start in range(0, count, self.batch_size):
+            part = np.arange(start, min(start + self.batch_size, count))
+            directions = self._primary_rays(xs[part], ys[part])[1]
+            if reshade:
+                colors[part] = self._shade_from_gbuffer(gbuffer, part, directions)
+            else:
+                colors[part] = self._shade_many(gbuffer.hits.take(part), directions, rng, gbuffer, part)
+
+        self._gbuffer = gbuffer
+        self._gbuffer_geometry = geometry
+        self._gbuffer_lights = lights
+        return colors.reshape(self.height, self.width, 3)
+
+    def clear_gbuffer(self):
+        """Освобождает G-буфер render_relightable_image"""
+        self._gbuffer = None
+        self._gbuffer_geometry = None
+        self._gbuffer_lights = None
+
+    def _geometry_key(self):
+        """Отпечаток всего, что влияет на первичные пересечения (без материалов)"""
+        shapes = [(type(shape).__qualname__,
+                   {k: v for k, v in vars(shape).items() if k != 'material' and not k.startswith('_')})
+                  for shape in self.scene.shapes]
+        return fingerprint((shapes, self.camera, self.width, self.height))
+
+    def _visibility_key(self):
+        """Отпечаток источников света без их цветов: от него зависит видимость сэмплов"""
+        colors = ('diffuse', 'specular', 'ambient')
+        lights = [(type(light).__qualname__,
+                   {k: v for k, v in vars(light).items() if k not in colors and not k.startswith('_')})
+                  for light in self.scene.lights]
+        return fingerprint(lights)
+
+    def _trace_primary(self, xs, ys, hits):
+        """Первичные пересечения для пикселей xs, ys в пакет hits (без затенения)"""
+        if self.stats is not None:
+            self.stats.count('primary_rays', len(xs))
+
+        for start in range(0, len(xs), self.batch_size):
+            part = slice(start, start + self.batch_size)
+            origins, directions = self._primary_rays(xs[part], ys[part])
+            hits.assign(part, self.scene.intersect_many(origins, directions))
+
+    def render_denoised(self, seed=0, shadow_samples=4, iterations=2):
+        """Рендерит с малым числом лучей тени и сглаженной видимостью, возвращает Surface Pygame"""
+        def render():
+            return self._to_surface(self.render_denoised_image(seed, shadow_samples, iterations))
+
+        return self._cached(('denoised', seed, shadow_samples, iterations, self.batch_size), render)
+
+    def render_denoised_image(self, seed=0, shadow_samples=4, iterations=2):
+        """Как render_denoised, но возвращает float-изображение (h, w, 3).
+
+        Видимость источника считается по shadow_samples лучам тени и
+        сглаживается denoise_visibility; остальное освещение - по полному
+        числу сэмплов источника, для него лучи тени не нужны.
+        """
+        layers = self.render_layers(seed, shadow_samples)
+        visibility = denoise_visibility(layers.visibility, layers.depth, layers.normal,
+                                        layers.shape_index, iterations)
         light = self.scene.lights[0] if self.scene.lights else None
+        # Как в полном рендере: видимость меньше одного сэмпла из table_size() - тень
+        min_visibility = 0.5 / light.table_size() if light else 0.0
+        return layers.compose(visibility, min_visibility)
+
+    def render_layers(self, seed=0, shadow_samples=None):
+        """Рендерит кадр в RenderLayers: видимость источника отдельно от цвета.
+
+        shadow_samples - число лучей тени на точку вместо настроек источника.
+        """
+        rng = np.random.default_rng(seed)
+        layers = RenderLayers(self.width, self.height)
+        ys, xs = np.mgrid[0:self.height, 0:self.width]
+        xs, ys = xs.ravel(), ys.ravel()
+        if self.stats is not None:
+            self.stats.count('primary_rays', len(xs))
 
+        light = self.scene.lights[0] if self.scene.lights else None
+        shadow_light = light
+        if light and shadow_samples is not None:
+            shadow_light = copy.copy(light)
+            shadow_light.samples = shadow_samples
+            shadow_light.max_samples = shadow_samples
+            shadow_light.min_samples = min(light.min_samples, shadow_samples)
+
+        for start in range(0, len(xs), self.batch_size):
+            part = slice(start, start + self.batch_size)
+            origins, directions = self._primary_rays(xs[part], ys[part])
+            hits = self.scene.intersect_many(origins, directions)
+            self._shade_layers(hits, directions, rng, light, shadow_light, layers, ys[part], xs[part])
+
+        return layers
+
+    def _shade_layers(self, hits, directions, rng, light, shadow_light, layers, ys, xs):
+        """Записывает слои для пикселей ys, xs по их первичным пересечениям hits.
+
+        Видимость считается лучами тени к shadow_light, освещение без
+        препятствий - по сэмплам light.
+        """
+        layers.depth[ys, xs] = hits.distance
+        layers.normal[ys, xs] = hits.normal
+        layers.shape_index[ys, xs] = hits.shape_index
+        layers.shadow[ys, xs] = self.background
+
+        valid = hits.is_valid()
+        if not np.any(valid):
+            return
+        ys, xs = ys[valid], xs[valid]
+
+        diffuse, specular, ambient = self._material_arrays(hits.shape_index[valid])
+        base = hits.color[valid]
         if not light:
-            return result.color * material.ambient
+            layers.shadow[ys, xs] = base * ambient
+            return
+
+        points = hits.point[valid]
+        normals = hits.normal[valid]
+        view_dir = -directions[valid]
+        rotations = shadow_light.sample_rotations(len(points), rng)
+
+        visible_count, diffuse_sum, specular_sum, taken = self._sample_visibility_many(
+            points, normals, view_dir, shadow_light, rotations, rng)
+        samples = light.table_size()
+        diffuse_all, specular_all = self._unoccluded_sums(points, normals, view_dir, light, samples,
+                                                          light.sample_rotations(len(points), rng), rng)
+
+        layers.visibility[ys, xs] = visible_count / taken
+        layers.direct[ys, xs] = (base * diffuse * light.diffuse * diffuse_all[:, None]
+                                 + base * specular * light.specular * specular_all[:, None]) / samples
+        layers.ambient[ys, xs] = base * light.ambient * ambient
+        layers.shadow[ys, xs] = base * light.ambient
+
+    def render_antialiased_image(self, seed=0, subsamples=4, budget=0.1,
+                                 color_threshold=0.1, depth_threshold=0.05):
+        """Как render_antialiased, но возвращает float-изображение (h, w, 3)"""
+        rng = np.random.default_rng(seed)
+        image, hits = self._render_with_hits(rng)
+        return self._antialias(image, hits, rng, subsamples, budget, color_threshold, depth_threshold)
+
+    def _render_with_hits(self, rng):
+        """Первый проход по всему кадру: изображение (h, w, 3) и первичные пересечения"""
+        ys, xs = np.mgrid[0:self.height, 0:self.width]
+        hits = IntersectionBatch(self.width * self.height)
+        colors = self._render_pixels(xs.ravel(), ys.ravel(), rng, hits)
+        return colors.reshape(self.height, self.width, 3), hits
+
+    def _antialias(self, image, hits, rng, subsamples, budget, color_threshold, depth_threshold):
+        """Досчитывает подпиксельные лучи в краевых пикселях изображения"""
+        shape = (self.height, self.width)
+        contrast = edge_contrast(image, hits.distance.reshape(shape), hits.shape_index.reshape(shape),
+                                 color_threshold, depth_threshold)
+        ys, xs = select_pixels(contrast, int(budget * self.width * self.height))
+        if len(xs) == 0:
+            return image
+
+        offsets = SUBPIXEL_OFFSETS[:subsamples]
+        sub_xs = (xs[:, None] + offsets[None, :, 0]).ravel()
+        sub_ys = (ys[:, None] + offsets[None, :, 1]).ravel()
+        extra = self._render_pixels(sub_xs, sub_ys, rng).reshape(len(xs), len(offsets), 3)
+
+        image = image.copy()
+        image[ys, xs] = (image[ys, xs] + extra.sum(axis=1)) / (len(offsets) + 1)
+        return image
+
+    def _render_region(self, x0, y0, x1, y1, rng):
+        """Рендерит прямоугольник изображения, результат (h, w, 3) float"""
+        ys, xs = np.mgrid[y0:y1, x0:x1]
+        return self._render_pixels(xs.ravel(), ys.ravel(), rng).reshape(y1 - y0, x1 - x0, 3)
+
+    def _render_pixels(self, xs, ys, rng, hits=None):
+        """Рендерит пиксели с координатами xs, ys пакетами по batch_size, результат (N, 3).
+
+        Если передан IntersectionBatch hits, в него сохраняются первичные пересечения.
+        """
+        colors = np.empty((len(xs), 3))
+        stats = self.stats
+        if stats is not None:
+            stats.count('primary_rays', len(xs))
+            stats.start_lap()
+
+        for start in range(0, len(xs), self.batch_size):
+            part = slice(start, start + self.batch_size)
+            origins, directions = self._primary_rays(xs[part], ys[part])
+            if stats is not None:
+                stats.lap('ray_generation')
+
+            primary = self.scene.intersect_many(origins, directions)
+            if stats is not None:
+                stats.lap('intersection')
+
+            colors[part] = self._shade_many(primary, directions, rng)
+            if hits is not None:
+                hits.assign(part, primary)
+            if stats is not None:
+                stats.lap('shading')
+
+        return colors
+
+    def _primary_rays(self, xs, ys):
+        """Первичные лучи для массивов координат пикселей"""
+        ndc_x = (2.0 * xs / self.width) - 1.0
+        ndc_y = 1.0 - (2.0 * ys / self.height)
+
+        directions = self.camera.ray_directions(ndc_x, ndc_y)
+        origins = np.broadcast_to(self.camera.position.astype(np.float64), directions.shape)
+        return origins, directions
+
+    def _trace_many(self, origins, directions, rng):
+        """Пакетная версия _trace_ray: цвета (N,3) для массивов лучей"""
+        return self._shade_many(self.scene.intersect_many(origins, directions), directions, rng)
+
+    def _shade_many(self, hits, directions, rng, gbuffer=None, pixels=None):
+        """Освещение найденных первичных пересечений, цвета (N,3).
+
+        Если передан GBuffer gbuffer, в него для пикселей pixels (индексы
+        в буфере, по одному на луч) записываются сэмплы источника и их видимость;
+        visibility_cache в этом случае не используется.
+        """
+        colors = np.tile(self.background, (len(hits), 1)).astype(np.float64)
+
+        valid = hits.is_valid()
+        if not np.any(valid):
+            return colors
+
+        diffuse, specular, ambient = self._material_arrays(hits.shape_index[valid])
+        base = hits.color[valid]
+        light = self.scene.lights[0] if self.scene.lights else None
 
-        light_samples = light.get_samples_points()
-        visible_samples = 0
-        total_diffuse = vector3(0, 0, 0)
-        total_specular = vector3(0, 0, 0)
+        if not light:
+            colors[valid] = base * ambient
+            return colors
+
+        points = hits.point[valid]
+        normals = hits.normal[valid]
+        count = len(points)
+
+        view_dir = -directions[valid]
+        rotations = light.sample_rotations(count, rng)
+        record = None
+        if gbuffer is not None:
+            record = (gbuffer, pixels[valid])
+            gbuffer.sample_point[record[1]] = points
+
+        cache = self.visibility_cache if gbuffer is None else None
+        if cache is None:
+            visible_count, diffuse_sum, specular_sum, taken = self._sample_visibility_many(
+                points, normals, view_dir, light, rotations, rng, record)
+        else:
+            visible_count, diffuse_sum, specular_sum, taken = self._cached_visibility_many(
+                cache, points, normals, view_dir, light, rotations, rng)
+
+        if gbuffer is not None:
+            gbuffer.taken[record[1]] = taken
+
+        colors[valid] = self._combine_lighting(base, diffuse, specular, ambient, light,
+                                               visible_count, diffuse_sum, specular_sum, taken)
+        return colors
+
+    def _sample_visibility_many(self, points, normals, view_dir, light, rotations, rng, record=None):
+        """Адаптивная выборка источника лучами тени.
+
+        Возвращает число видимых сэмплов, суммы диффузной и зеркальной
+        интенсивности по ним и число брошенных лучей, каждое - массив (N,).
+        """
+        # Первая серия лучей тени для всех точек
+        taken = light.first_batch_size()
+        visible_count, diffuse_sum, specular_sum = self._sample_light_many(
+            points, normals, view_dir, light, taken, 0, rotations, rng, record)
+        taken = np.full(len(points), taken)
+
+        # Адаптивная выборка: следующие серии только для точек в полутени
+        active = np.nonzero(light.needs_more_samples(visible_count, taken))[0]
+        while len(active):
+            start = taken[active[0]]
+            extra = light.next_batch_size(start)
+            more = self._sample_light_many(points[active], normals[active], view_dir[active], light,
+                                           extra, start, None if rotations is None else rotations[active], rng,
+                                           None if record is None else (record[0], record[1][active]))
+            visible_count[active] += more[0]
+            diffuse_sum[active] += more[1]
+            specular_sum[active] += more[2]
+            taken[active] += extra
+            active = active[light.needs_more_samples(visible_count[active], taken[active])]
+
+        return visible_count, diffuse_sum, specular_sum, taken
+
+    def _cached_visibility_many(self, cache, points, normals, view_dir, light, rotations, rng):
+        """Как _sample_visibility_many, но с долей видимых сэмплов из VisibilityCache.
+
+        Для точек из уже заполненных ячеек лучи тени не бросаются: освещение
+        считается по сэмплам без проверки препятствий и умножается на долю
+        видимых. Остальные точки трассируются как обычно и пополняют кеш.
+        """
+        cache.validate(self.scene)
+        fraction = cache.lookup(points, normals)
+        known = ~np.isnan(fraction)
+        if self.stats is not None:
+            self.stats.count('cached_visibility', np.count_nonzero(known))
+
+        count = len(points)
+        visible_count = np.zeros(count)
+        diffuse_sum = np.zeros(count)
+        specular_sum = np.zeros(count)
+        taken = np.zeros(count, dtype=np.int64)
+
+        unknown = np.nonzero(~known)[0]
+        if len(unknown):
+            results = self._sample_visibility_many(points[unknown], normals[unknown], view_dir[unknown], light,
+                                                   None if rotations is None else rotations[unknown], rng)
+            for total, part in zip((visible_count, diffuse_sum, specular_sum, taken), results):
+                total[unknown] = part
+            cache.add(points[unknown], normals[unknown], visible_count[unknown], taken[unknown])
+
+        known = np.nonzero(known)[0]
+        if len(known):
+            samples = light.first_batch_size()
+            diffuse_all, specular_all = self._unoccluded_sums(
+                points[known], normals[known], view_dir[known], light, samples,
+                None if rotations is None else rotations[known], rng)
+
+            visible = fraction[known]
+            visible_count[known] = visible * samples
+            diffuse_sum[known] = visible * diffuse_all
+            specular_sum[known] = visible * specular_all
+            taken[known] = samples
+
+        return visible_count, diffuse_sum, specular_sum, taken
+
+    def _unoccluded_sums(self, points, normals, view_dir, light, samples, rotations, rng):
+        """Суммы диффузной и зеркальной интенсивности samples сэмплов источника без лучей тени"""
+        uv = light.get_samples_uv_many(len(points), rng, samples, 0, rotations)
+        to_light = light.uv_to_points(uv) - points[:, None, :]
+        light_dir = to_light / np.linalg.norm(to_light, axis=2)[..., None]
+        unoccluded = np.ones((len(points), samples), dtype=bool)
+        return self._light_sums(normals, view_dir, light_dir, unoccluded)[1:]
+
+    def _combine_lighting(self, base, diffuse, specular, ambient, light, visible_count, diffuse_sum, specular_sum, taken):
+        """Итоговый цвет по суммам диффузной и зеркальной интенсивности видимых сэмплов"""
+        # Усреднение с учетом доли видимых сэмплов
+        lit = (base * diffuse * light.diffuse * diffuse_sum[:, None]
+               + base * specular * light.specular * specular_sum[:, None]) / taken[:, None]
+        lit = np.clip(lit + base * light.ambient * ambient, 0, 1)
+
+        in_shadow = (visible_count == 0)[:, None]
+        return np.where(in_shadow, base * light.ambient, lit)
+
+    def _sample_light_many(self, points, normals, view_dir, light, samples, start, rotations, rng, record=None):
+        """Бросает samples лучей тени из каждой точки, начиная со start-й точки таблицы выборки.
+
+        Возвращает число видимых сэмплов и суммы диффузной и зеркальной
+        интенсивности по видимым сэмплам, каждое - массив (N,). record -
+        необязательная пара (GBuffer, пиксели) для сохранения сэмплов.
+        """
+        count = len(points)
+        uv = light.get_samples_uv_many(count, rng, samples, start, rotations)
+        light_points = light.uv_to_points(uv)
+        to_light = light_points - points[:, None, :]
+        light_distance = np.linalg.norm(to_light, axis=2)
+        light_dir = to_light / light_distance[..., None]
+
+        shadow_origins = np.repeat(points + normals * 0.001, samples, axis=0)
+        if self.stats is not None:
+            self.stats.count('shadow_rays', len(shadow_origins))
+        blocked = self.scene.occluded_many(shadow_origins, light_dir.reshape(-1, 3), light_distance.ravel())
+        visible = ~blocked.reshape(count, samples)
+
+        if record is not None:
+            gbuffer, pixels = record
+            gbuffer.store_samples(pixels, start, uv, visible)
+
+        return self._light_sums(normals, view_dir, light_dir, visible)
+
+    def _light_sums(self, normals, view_dir, light_dir, visible):
+        """Число видимых сэмплов и суммы диффузной и зеркальной интенсивности по ним"""
+        # Диффузная и зеркальная компоненты для каждого сэмпла
+        n_dot_l = np.einsum('ij,isj->is', normals, light_dir)
+        diffuse_intensity = np.maximum(0, n_dot_l)
+
+        reflect_dir = -light_dir + 2 * n_dot_l[..., None] * normals[:, None, :]
+        spec_angle = np.maximum(0, np.einsum('ij,isj->is', view_dir, reflect_dir))
+        spec_intensity = spec_angle ** 32
+
+        return (visible.sum(axis=1),
+                (diffuse_intensity * visible).sum(axis=1),
+                (spec_intensity * visible).sum(axis=1))
+
+    def _shade_from_gbuffer(self, gbuffer, pixels, directions):
+        """Цвета пикселей pixels по сохраненной в gbuffer видимости, без лучей тени.
+
+        Точка, нормаль и направление взгляда берутся текущие (gbuffer.hits и
+        directions), поэтому зеркальная компонента пересчитывается для нового вида.
+        """
+        hits = gbuffer.hits.take(pixels)
+        colors = np.tile(self.background, (len(pixels), 1)).astype(np.float64)
+
+        valid = hits.is_valid()
+        if not np.any(valid):
+            return colors
+
+        diffuse, specular, ambient = self._material_arrays(hits.shape_index[valid])
+        base = hits.color[valid]
+        light = self.scene.lights[0] if self.scene.lights else None
 
-        for light_sample in light_samples:
-            # Луч от сэмпла до точки
-            to_light = light_sample - result.point
-            light_distance = length(to_light)
-            light_dir = normalize(to_light)
+        if not light:
+            colors[valid] = base * ambient
+            return colors
+
+        source = pixels[valid]
+        points = hits.point[valid]
+        taken = gbuffer.taken[source]
+        # Сэмплы сверх taken не бросались и видимыми не считаются
+        used = np.arange(gbuffer.max_samples)[None, :] < taken[:, None]
+        visible = gbuffer.visible[source] & used
+
+        to_light = light.uv_to_points(gbuffer.light_uv[source]) - points[:, None, :]
+        light_dir = to_light / np.linalg.norm(to_light, axis=2)[..., None]
+        visible_count, diffuse_sum, specular_sum = self._light_sums(
+            hits.normal[valid], -directions[valid], light_dir, visible)
+
+        colors[valid] = self._combine_lighting(base, diffuse, specular, ambient, light,
+                                               visible_count, diffuse_sum, specular_sum, taken)
+        return colors
+
+    def _material_arrays(self, shape_index):
+        """Массивы diffuse/specular/ambient материалов для индексов фигур"""
+        materials = [shape.material for shape in self.scene.shapes]
+        diffuse = np.array([m.diffuse for m in materials], dtype=np.float64)
+        specular = np.array([m.specular for m in materials], dtype=np.float64)
+        ambient = np.array([m.ambient for m in materials], dtype=np.float64)
+        return diffuse[shape_index], specular[shape_index], ambient[shape_index]
+
+    def _to_surface(self, image):
+        """Копирует float-изображение (h, w, 3) в Surface Pygame одной операцией"""
+        if self.stats is None:
+            return self._blit(image)
+
+        with self.stats.phase('pixel_write'):
+            return self._blit(image)
+
+    def _blit(self, image):
+        height, width = image.shape[:2]
+        surface = pygame.Surface((width, height))
+        pygame.surfarray.blit_array(surface, self._to_pixels(image))
+        return surface
 
-            # Испускаем луч в сторону света из точки
-            shadow_ray = Ray(result.point + result.normal * 0.001, light_dir)
-            shadow_intersection = self.scene.intersect(shadow_ray)
+    @staticmethod
+    def _to_pixels(image):
+        """Переводит float-изображение (h, w, 3) в массив surfarray (w, h, 3) uint8"""
+        return (np.clip(image, 0, 1) * 255).astype(np.uint8).transpose(1, 0, 2)
 
-            # Препятствие между точкой и светом
-            if shadow_intersection.is_valid() and shadow_intersection.distance < light_distance:
-                continue
+    def _trace_ray(self, ray: Ray, depth: int = 0, rng=None) -> np.ndarray:
+        """Трассирует луч и возвращает цвет (кортеж float на бэкенде 'scalar')"""
+        if depth > 1:
+            return vector3(0, 0, 0)  # Черный цвет для глубокой рекурсии
 
-            # Этот сэмпл видит свет
-            visible_samples += 1
+        return self._shade(ray, self.scene.intersect(ray), rng)
 
-            # Диффузная компонента
-            diffuse_intensity = max(0, dot(result.normal, light_dir))
-            total_diffuse += result.color * material.diffuse * light.diffuse * diffuse_intensity
+    def _shade(self, ray: Ray, intersection: IntersectionResult, rng=None) -> np.ndarray:
+        """Цвет луча ray по найденному пересечению intersection"""
+        # Фоновый цвет
+        if not intersection.is_valid():  # Используем is_valid() вместо bool
+            return self.background  # Сине-голубой фон
 
-            # Зеркальная компонента
-            view_dir = normalize(-ray.direction)
-            reflect_dir = self._reflect(-light_dir, result.normal)
-            spec_angle = max(0, dot(view_dir, reflect_dir))
-            spec_intensity = math.pow(spec_angle, 32)
+        m = MATH_BACKENDS[self.math_backend]
+        material = intersection.material
+        color = m.convert(intersection.color)
+        light = self.scene.lights[0] if self.scene.lights else None
 
-            total_specular += result.color * material.specular * light.specular * spec_intensity
+        if not light:
+            return m.mul(color, m.convert(material.ambient))
+
+        point = m.convert(intersection.point)
+        normal = m.convert(intersection.normal)
+        light_ambient = m.convert(light.ambient)
+
+        visible_samples = 0
+        taken = 0
+        batch = light.first_batch_size()
+        rotation = light.sample_rotation(rng)
+        total_diffuse = m.vector3(0, 0, 0)
+        total_specular = m.vector3(0, 0, 0)
+
+        # Не зависят от сэмпла, считаем один раз на точку
+        shadow_origin = m.add(point, m.scale(normal, 0.001))
+        view_dir = m.normalize(m.scale(ray.direction, -1))
+        diffuse_color = m.mul(m.mul(color, m.convert(material.diffuse)), m.convert(light.diffuse))
+        specular_color = m.mul(m.mul(color, m.convert(material.specular)), m.convert(light.specular))
+
+        # Доля видимых сэмплов из мирового кеша: лучи тени не нужны
+        cache = self.visibility_cache
+        fraction = math.nan
+        if cache is not None:
+            fraction = cache.lookup(np.array([intersection.point]), np.array([intersection.normal]))[0]
+            if not math.isnan(fraction):
+                if self.stats is not None:
+                    self.stats.count('cached_visibility')
+                batch = 0
+                for light_sample in m.rows(light.get_samples_points(rng, light.first_batch_size(), 0, rotation)):
+                    light_dir = m.normalize(m.sub(light_sample, point))
+                    visible_samples += 1
+                    total_diffuse = m.add(total_diffuse, m.scale(diffuse_color, max(0, m.dot(normal, light_dir))))
+                    spec_angle = max(0, m.dot(view_dir, m.reflect(m.scale(light_dir, -1), normal)))
+                    total_specular = m.add(total_specular, m.scale(specular_color, math.pow(spec_angle, 32)))
+                taken = visible_samples
+                visible_samples *= fraction
+                total_diffuse = m.scale(total_diffuse, fraction)
+                total_specular = m.scale(total_specular, fraction)
+
+        while batch > 0:
+            for light_sample in m.rows(light.get_samples_points(rng, batch, taken, rotation)):
+                # Луч от сэмпла до точки
+                to_light = m.sub(light_sample, point)
+                light_distance = m.length(to_light)
+                light_dir = m.divide(to_light, light_distance)
+
+                # Испускаем луч в сторону света из точки
+                shadow_ray = Ray.normalized(shadow_origin, light_dir)
+                if self.stats is not None:
+                    self.stats.count('shadow_rays')
+
+                # Препятствие между точкой и светом
+                if self.scene.occluded(shadow_ray, light_distance):
+                    continue
+
+                # Этот сэмпл видит свет
+                visible_samples += 1
+
+                # Диффузная компонента
+                diffuse_intensity = max(0, m.dot(normal, light_dir))
+                total_diffuse = m.add(total_diffuse, m.scale(diffuse_color, diffuse_intensity))
+
+                # Зеркальная компонента
+                reflect_dir = m.reflect(m.scale(light_dir, -1), normal)
+                spec_angle = max(0, m.dot(view_dir, reflect_dir))
+                spec_intensity = math.pow(spec_angle, 32)
+
+                total_specular = m.add(total_specular, m.scale(specular_color, spec_intensity))
+
+            taken += batch
+            # Адаптивная выборка: продолжаем только в полутени
+            batch = light.next_batch_size(taken) if light.needs_more_samples(visible_samples, taken) else 0
+
+        if cache is not None and math.isnan(fraction):
+            cache.add(np.array([intersection.point]), np.array([intersection.normal]), [visible_samples], [taken])
 
         if visible_samples == 0:
-            return result.color * light.ambient  # Полная тень
+            return m.mul(color, light_ambient)  # Полная тень
 
         # Коэффициент видимости = доля видимых сэмплов
-        visibility = visible_samples / len(light_samples)
+        visibility = visible_samples / taken
 
         # Усреднение освещения по видимым сэмплам
-        diffuse = total_diffuse / visible_samples
-        specular = total_specular / visible_samples
-        ambient = result.color * light.ambient * material.ambient
+        diffuse = m.divide(total_diffuse, visible_samples)
+        specular = m.divide(total_specular, visible_samples)
+        ambient = m.mul(m.mul(color, light_ambient), m.convert(material.ambient))
 
         # Финальный цвет с учетом видимости
-        final_color = (diffuse + specular) * visibility + ambient
-        return clamp(final_color, 0, 1)
-
-    def _reflect(self, vector: np.ndarray, normal: np.ndarray) -> np.ndarray:
-        """Отражение вектора от нормали"""
-        dot_product = dot(vector, normal)
-        return vector - 2 * dot_product * normal
\ No newline at end of file
+        final_color = m.add(m.scale(m.add(diffuse, specular), visibility), ambient)
+        return m.clamp(final_color, 0, 1)
+
+
+# Состояние процесса пула для render_tiled
+_worker_tracer = None
+
+
+def _init_tile_worker(tracer_bytes):
+    """Инициализатор процесса: один раз восстанавливает трассировщик со сценой"""
+    global _worker_tracer
+    _worker_tracer = pickle.loads(tracer_bytes)
+
+
+def _init_pool_worker(tracer_bytes):
+    """Инициализатор процесса пула для iter_tiles"""
+    # Обработчик SIGTERM, унаследованный от pygame родителя, не дает пулу завершить процесс
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _init_tile_worker(tracer_bytes)
+
+
+def _render_tile(tile):
+    """Рендерит один тайл в процессе пула"""
+    x0, y0, x1, y1, seed = tile
+    rng = np.random.default_rng((seed, x0, y0))
+    stats = _worker_tracer.stats
+    cache = _worker_tracer.visibility_cache
+    if stats is not None:
+        # Каждый тайл возвращает только свою статистику, сумму собирает iter_tiles
+        stats.reset()
+    if cache is not None:
+        # И только свои пополнения кеша видимости; сам кеш процесса пополняется дальше
+        cache.record()
+    image = _worker_tracer._render_region(x0, y0, x1, y1, rng)
+    return (x0, y0, image, stats.to_dict() if stats is not None else None,
+            cache.take_recorded() if cache is not None else None)
@@ -0,0 +1,140 @@
+import numpy as np
+import hashlib
+import os
+import tempfile
+import zipfile
+
+# Увеличить при изменениях рендерера, меняющих картинку для той же сцены
+CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    """Каталог кеша по умолчанию: $XDG_CACHE_HOME/lab8_raytracer или ~/.cache/lab8_raytracer"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'lab8_raytracer')
+
+
+def fingerprint(value, digest=None):
+    """Хеш содержимого значения: массивов, чисел, коллекций и объектов сцены.
+
+    У объектов учитываются класс и публичные атрибуты; атрибуты с подчеркиванием
+    (кеши вроде BVH или таблиц выборки) пропускаются.
+    """
+    top = digest is None
+    digest = digest if digest is not None else hashlib.sha256()
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        digest.update(f'{type(value).__name__}:{value!r};'.encode())
+    elif isinstance(value, (np.ndarray, np.generic)):
+        array = np.ascontiguousarray(value)
+        digest.update(f'ndarray:{array.dtype.str}:{array.shape};'.encode())
+        digest.update(array.tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}:{len(value)}['.encode())
+        for item in value:
+            fingerprint(item, digest)
+        digest.update(b']')
+    elif isinstance(value, dict):
+        digest.update(f'dict:{len(value)}{{'.encode())
+        for key in sorted(value, key=repr):
+            fingerprint(key, digest)
+            fingerprint(value[key], digest)
+        digest.update(b'}')
+    elif callable(value) and not hasattr(value, '__dict__'):
+        digest.update(f'callable:{getattr(value, "__qualname__", type(value).__name__)};'.encode())
+    else:
+        cls = type(value)
+        digest.update(f'object:{cls.__module__}.{cls.__qualname__}('.encode())
+        state = {k: v for k, v in vars(value).items() if not k.startswith('_')} \
+            if hasattr(value, '__dict__') else {}
+        fingerprint(state, digest)
+        digest.update(b')')
+
+    return digest.hexdigest() if top else digest
+
+
+class RenderCache:
+    """Кеш готовых кадров на диске с адресацией по содержимому и вытеснением LRU.
+
+    Кадры хранятся сжатыми .npz в каталоге directory; общий размер файлов
+    ограничен max_bytes, при превышении удаляются давно не читанные записи.
+    """
+
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        self.directory = directory if directory is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, *parts):
+        """Ключ кеша по содержимому сцены, камеры и настроек рендера"""
+        return fingerprint((CACHE_VERSION,) + parts)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """Кадр по ключу или None, если его нет в кеше или запись повреждена"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                image = data['image']
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Поврежденная запись - промах; удаляем ее, чтобы store записал заново
+            _remove(path)
+            return None
+
+        # Время изменения файла служит отметкой последнего использования для LRU
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Запись успел вытеснить другой процесс с тем же каталогом
+        return image
+
+    def store(self, key, image):
+        """Сохраняет кадр и вытесняет старые записи сверх лимита"""
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez_compressed(file, image=image)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+        self._evict()
+
+    def clear(self):
+        """Удаляет все записи кеша"""
+        for entry in self._entries():
+            os.unlink(entry.path)
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith('.npz')]
+
+    def _evict(self):
+        # Записи, удаленные другим процессом между scandir и stat, пропускаем
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= size
+            _remove(path)
+
+
+def _remove(path):
+    """Удаляет файл; ошибки (файл уже удалил другой процесс, нет прав) не мешают рендеру"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -0,0 +1,118 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class RenderStats:
+    """Счетчики лучей и время по фазам рендера.
+
+    Заполняется только если включена через RayTracer.enable_stats(); читается
+    после рендера или выгружается в JSON через to_json().
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.shapes = defaultdict(lambda: defaultdict(int))
+        self.phase_times = defaultdict(float)
+        self._lap_start = time.perf_counter()
+
+    def count(self, name, amount=1):
+        """Увеличивает счетчик name (primary_rays, shadow_rays, quartic_solves...)"""
+        self.counters[name] += int(amount)
+
+    def count_shape(self, shape_name, hits=0, misses=0, occlusion_tests=0, occlusions=0):
+        """Учитывает результаты запросов к фигуре shape_name"""
+        counters = self.shapes[shape_name]
+        counters['hits'] += int(hits)
+        counters['misses'] += int(misses)
+        counters['occlusion_tests'] += int(occlusion_tests)
+        counters['occlusions'] += int(occlusions)
+
+    def add_time(self, phase, seconds):
+        self.phase_times[phase] += seconds
+
+    def start_lap(self):
+        """Начинает отсчет для lap()"""
+        self._lap_start = time.perf_counter()
+
+    def lap(self, phase):
+        """Добавляет к фазе phase время с предыдущего lap() или start_lap()"""
+        now = time.perf_counter()
+        self.phase_times[phase] += now - self._lap_start
+        self._lap_start = now
+
+    @contextmanager
+    def phase(self, name):
+        """Контекст, время которого добавляется к фазе name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - start
+
+    @property
+    def total_rays(self):
+        return self.counters['primary_rays'] + self.counters['shadow_rays']
+
+    def merge(self, other):
+        """Добавляет статистику другого объекта (например, процесса пула)"""
+        other = other.to_dict() if isinstance(other, RenderStats) else other
+        for name, value in other['counters'].items():
+            self.counters[name] += value
+        for shape_name, counters in other['shapes'].items():
+            for name, value in counters.items():
+                self.shapes[shape_name][name] += value
+        for phase, seconds in other['phase_times'].items():
+            self.phase_times[phase] += seconds
+
+    def reset(self):
+        self.counters.clear()
+        self.shapes.clear()
+        self.phase_times.clear()
+
+    def to_dict(self):
+        return {
+            'counters': dict(self.counters),
+            'shapes': {name: dict(counters) for name, counters in self.shapes.items()},
+            'phase_times': dict(self.phase_times),
+        }
+
+    def to_json(self, path=None):
+        """JSON-строка со статистикой; если задан path, она же пишется в файл"""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def __getstate__(self):
+        # defaultdict с lambda не сериализуется pickle
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.merge(state)
+
+
+class ProgressReporter:
+    """Вызывает callback(done, total) не чаще, чем раз в interval секунд"""
+
+    def __init__(self, callback, total, interval=0.5):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self._last = 0.0
+
+    def update(self, done):
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        if done >= self.total or now - self._last >= self.interval:
+            self._last = now
+            self.callback(done, self.total)
+
+
+def print_progress(done, total):
+    """Стандартный callback прогресса: печатает долю готовых пикселей"""
+    print(f"Rendered {done}/{total} pixels ({done / total * 100:.1f}%)")
@@ -0,0 +1,200 @@
+import numpy as np
+import random
+from abc import ABC, abstractmethod
+
+
+class Sampler(ABC):
+    """Генератор точек выборки в единичном квадрате [0, 1)^2.
+
+    Таблица точек строится один раз для каждого размера и кешируется;
+    для каждой точки сцены она сдвигается по тору на случайный вектор
+    (поворот Крэнли-Паттерсона), что сохраняет равномерность узора.
+    Префиксы таблицы тоже распределены равномерно, поэтому адаптивная
+    выборка может брать ее сериями начиная со start.
+    """
+
+    def __init__(self):
+        self._tables = {}
+
+    def table(self, size):
+        """Предвычисленная таблица (size, 2)"""
+        if size not in self._tables:
+            self._tables[size] = self._build_table(size)
+        return self._tables[size]
+
+    @abstractmethod
+    def _build_table(self, size):
+        """Строит таблицу (size, 2) точек выборки"""
+        pass
+
+    def rotation(self, rng=None):
+        """Сдвиг таблицы для одной точки сцены"""
+        source = rng if rng is not None else random
+        return np.array([source.random(), source.random()])
+
+    def rotations(self, count, rng=None):
+        """Сдвиги таблицы для count точек сцены, результат (count, 2)"""
+        rng = rng if rng is not None else np.random.default_rng()
+        return rng.random((count, 2))
+
+    def points(self, size, count, start=0, rotation=None, rng=None):
+        """count точек таблицы размера size начиная со start, результат (count, 2)"""
+        if rotation is None:
+            rotation = self.rotation(rng)
+        return (self.table(size)[start:start + count] + rotation) % 1.0
+
+    def points_many(self, size, n, count, start=0, rotations=None, rng=None):
+        """Пакетная версия points для n точек сцены, результат (n, count, 2)"""
+        if rotations is None:
+            rotations = self.rotations(n, rng)
+        return (self.table(size)[None, start:start + count] + rotations[:, None, :]) % 1.0
+
+
+class RandomSampler(Sampler):
+    """Независимые равномерные случайные точки (исходное поведение AreaLight)"""
+
+    def _build_table(self, size):
+        # points и points_many берут новые точки на каждый вызов, таблица - для прямых вызовов table()
+        return np.random.default_rng().random((size, 2))
+
+    def rotation(self, rng=None):
+        return None
+
+    def rotations(self, count, rng=None):
+        return None
+
+    def points(self, size, count, start=0, rotation=None, rng=None):
+        source = rng if rng is not None else random
+        uv = np.empty((count, 2))
+        for i in range(count):
+            uv[i, 0] = source.random()
+            uv[i, 1] = source.random()
+        return uv
+
+    def points_many(self, size, n, count, start=0, rotations=None, rng=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        u = rng.random((n, count))
+        v = rng.random((n, count))
+        return np.stack([u, v], axis=2)
+
+
+class StratifiedSampler(Sampler):
+    """Стратифицированная выборка с дрожанием внутри ячеек сетки"""
+
+    def __init__(self, seed=0):
+        super().__init__()
+        self.seed = seed
+
+    def _build_table(self, size):
+        rng = np.random.default_rng(self.seed)
+        columns = int(np.ceil(np.sqrt(size)))
+        rows = int(np.ceil(size / columns))
+
+        j, i = np.mgrid[0:rows, 0:columns]
+        i = i.ravel()
+        j = j.ravel()
+
+        # Порядок ячеек по перевернутому коду Мортона: любой префикс покрывает квадрат
+        # равномерно, что нужно адаптивной выборке
+        order = np.argsort([_reverse_bits(_morton(a, b)) for a, b in zip(i, j)], kind='stable')
+        cells = np.stack([i[order], j[order]], axis=1)[:size]
+
+        jitter = rng.random((size, 2))
+        return (cells + jitter) / np.array([columns, rows])
+
+
+class HaltonSampler(Sampler):
+    """Последовательность Холтона по основаниям 2 и 3"""
+
+    def _build_table(self, size):
+        index = np.arange(1, size + 1)
+        return np.stack([_radical_inverse(index, 2), _radical_inverse(index, 3)], axis=1)
+
+
+class SobolSampler(Sampler):
+    """Первые два измерения последовательности Соболя"""
+
+    def _build_table(self, size):
+        bits = max(1, int(size).bit_length())
+
+        # Направляющие числа второго измерения: m_k = 2 * m_(k-1) xor m_(k-1)
+        directions = []
+        m = 1
+        for k in range(1, bits + 1):
+            directions.append(m << (32 - k))
+            m = (m << 1) ^ m
+
+        table = np.empty((size, 2))
+        for index in range(size):
+            y = 0
+            for k in range(bits):
+                if index >> k & 1:
+                    y ^= directions[k]
+            table[index, 0] = _radical_inverse(np.array([index]), 2)[0]
+            table[index, 1] = y / 2.0 ** 32
+        return table
+
+
+class BlueNoiseSampler(Sampler):
+    """Синий шум: алгоритм лучшего кандидата Митчелла на торе"""
+
+    def __init__(self, seed=0, candidates=16):
+        super().__init__()
+        self.seed = seed
+        self.candidates = candidates
+
+    def _build_table(self, size):
+        rng = np.random.default_rng(self.seed)
+        table = np.empty((size, 2))
+        table[0] = rng.random(2)
+
+        for index in range(1, size):
+            trial = rng.random((self.candidates * index, 2))
+            delta = np.abs(trial[:, None, :] - table[None, :index, :])
+            delta = np.minimum(delta, 1 - delta)
+            nearest = (delta * delta).sum(axis=2).min(axis=1)
+            table[index] = trial[np.argmax(nearest)]
+
+        return table
+
+
+SAMPLERS = {
+    'random': RandomSampler,
+    'stratified': StratifiedSampler,
+    'halton': HaltonSampler,
+    'sobol': SobolSampler,
+    'bluenoise': BlueNoiseSampler,
+}
+
+
+def make_sampler(name):
+    """Создает генератор выборки по имени из SAMPLERS"""
+    try:
+        return SAMPLERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown sampler '{name}', expected one of: {', '.join(SAMPLERS)}")
+
+
+def _radical_inverse(index, base):
+    """Обратная запись чисел index по основанию base (ван дер Корпут)"""
+    index = np.array(index, dtype=np.int64)
+    result = np.zeros(len(index))
+    scale = 1.0 / base
+    while np.any(index > 0):
+        result += (index % base) * scale
+        index //= base
+        scale /= base
+    return result
+
+
+def _morton(x, y):
+    """Код Мортона для пары 16-битных координат"""
+    code = 0
+    for bit in range(16):
+        code |= ((x >> bit) & 1) << (2 * bit) | ((y >> bit) & 1) << (2 * bit + 1)
+    return code
+
+
+def _reverse_bits(value, width=32):
+    """Переворачивает width младших битов числа"""
+    return int(format(value, f'0{width}b')[::-1], 2)
@@ -1,6 +1,12 @@
+import numpy as np
 from Models.Ray import Ray
-from Models.IntersectionResult import IntersectionResult
+from Models.IntersectionResult import IntersectionResult, NO_HIT
+from Models.IntersectionBatch import IntersectionBatch
 from Shapes.Interfaces.IShape import IShape
+from BVH import BVH
+
+# С какого числа ограниченных фигур Scene строит BVH вместо линейного перебора
+BVH_MIN_SHAPES = 4
 
 
 class Scene:
@@ -8,6 +14,13 @@ class Scene:
         self.shapes = []
         self.lights = []
 
+        # Ускоряющая структура строится лениво при первом запросе
+        self._bvh = None
+        self._bounded = []
+        self._unbounded = []
+        self._accelerated_count = -1
+        self._stats = None
+
     # Свойства для совместимости с C#
     @property
     def Shapes(self):
@@ -16,6 +29,7 @@ class Scene:
     @Shapes.setter
     def Shapes(self, value):
         self.shapes = value
+        self.invalidate()
 
     @property
     def Lights(self):
@@ -28,19 +42,183 @@ class Scene:
     def add(self, shape: IShape):
         """Добавляет объект в сцену"""
         self.shapes.append(shape)
+        if self._stats is not None:
+            shape._stats = self._stats
+        self.invalidate()
 
     def add_light(self, light):
         """Добавляет источник света в сцену"""
         self.lights.append(light)
 
+    def invalidate(self):
+        """Сбрасывает BVH; вызывать после перемещения или изменения фигур"""
+        self._bvh = None
+        self._accelerated_count = -1
+
+    def _acceleration(self):
+        """Возвращает (bvh, ограниченные фигуры, бесконечные фигуры), перестраивая при необходимости"""
+        if self._accelerated_count != len(self.shapes):
+            bounded = []
+            self._unbounded = []
+            for index, shape in enumerate(self.shapes):
+                bounds = shape.bounds()
+                if bounds is None:
+                    self._unbounded.append((index, shape))
+                else:
+                    bounded.append((index, shape, bounds))
+
+            if len(bounded) >= BVH_MIN_SHAPES:
+                self._bvh = BVH([b[2][0] for b in bounded], [b[2][1] for b in bounded])
+                self._bounded = [(index, shape) for index, shape, bounds in bounded]
+            else:
+                # Для пары фигур обход дерева дороже линейного перебора
+                self._bvh = None
+                self._bounded = []
+                self._unbounded = list(enumerate(self.shapes))
+
+            self._accelerated_count = len(self.shapes)
+
+        return self._bvh, self._bounded, self._unbounded
+
+    def attach_stats(self, stats):
+        """Подключает RenderStats к сцене и ее фигурам (None - отключить)"""
+        self._stats = stats
+        for shape in self.shapes:
+            shape._stats = stats
+
     def intersect(self, ray: Ray) -> IntersectionResult:
         """Находит ближайшее пересечение луча со сценой"""
-        closest = IntersectionResult()  # По умолчанию нет пересечения
+        closest = NO_HIT  # По умолчанию нет пересечения
+        bvh, bounded, unbounded = self._acceleration()
+        stats = self._stats
 
-        for shape in self.shapes:
+        for index, shape in unbounded:
             intersection = shape.intersect(ray)
+            if stats is not None:
+                _count_hits(stats, index, shape, intersection.is_valid())
             # Используем is_valid() вместо прямого bool
             if intersection.is_valid() and intersection.distance < closest.distance:
                 closest = intersection
 
-        return closest
\ No newline at end of file
+        if bvh is not None:
+            def visit(primitives):
+                nonlocal closest
+                for primitive in primitives:
+                    index, shape = bounded[primitive]
+                    intersection = shape.intersect(ray)
+                    if stats is not None:
+                        _count_hits(stats, index, shape, intersection.is_valid())
+                    if intersection.is_valid() and intersection.distance < closest.distance:
+                        closest = intersection
+                return closest.distance
+
+            bvh.traverse(ray.origin, ray.direction, visit, closest.distance)
+
+        return closest
+
+    def intersect_many(self, origins, directions) -> IntersectionBatch:
+        """Находит ближайшие пересечения для пакета лучей (N,3)"""
+        closest = IntersectionBatch(len(origins))
+        bvh, bounded, unbounded = self._acceleration()
+        stats = self._stats
+
+        for index, shape in unbounded:
+            result = shape.intersect_many(origins, directions)
+            if stats is not None:
+                _count_hits(stats, index, shape, result.is_valid())
+            closest.merge(result, index)
+
+        if bvh is not None:
+            def visit(primitives, rays):
+                for primitive in primitives:
+                    index, shape = bounded[primitive]
+                    result = shape.intersect_many(origins[rays], directions[rays])
+                    if stats is not None:
+                        _count_hits(stats, index, shape, result.is_valid())
+                    closest.merge_at(result, rays, index)
+                return closest.distance[rays]
+
+            bvh.traverse_many(origins, directions, visit, closest.distance.copy())
+
+        return closest
+
+    def occluded(self, ray: Ray, max_distance) -> bool:
+        """Есть ли препятствие на луче ближе max_distance (для лучей тени)"""
+        bvh, bounded, unbounded = self._acceleration()
+        stats = self._stats
+
+        for index, shape in unbounded:
+            blocked = shape.occludes(ray, max_distance)
+            if stats is not None:
+                _count_occlusions(stats, index, shape, blocked)
+            if blocked:
+                return True
+
+        if bvh is None:
+            return False
+
+        def test(primitives):
+            for primitive in primitives:
+                index, shape = bounded[primitive]
+                blocked = shape.occludes(ray, max_distance)
+                if stats is not None:
+                    _count_occlusions(stats, index, shape, blocked)
+                if blocked:
+                    return True
+            return False
+
+        return bvh.any_hit(ray.origin, ray.direction, test, max_distance)
+
+    def occluded_many(self, origins, directions, max_distances):
+        """Пакетная версия occluded, результат - булева маска (N,)"""
+        max_distances = np.asarray(max_distances, dtype=np.float64)
+        blocked = np.zeros(len(origins), dtype=bool)
+        bvh, bounded, unbounded = self._acceleration()
+        stats = self._stats
+
+        for index, shape in unbounded:
+            # Уже перекрытые лучи дальше не проверяем
+            rays = np.nonzero(~blocked)[0]
+            if len(rays) == 0:
+                return blocked
+            result = shape.occludes_many(origins[rays], directions[rays], max_distances[rays])
+            if stats is not None:
+                _count_occlusions(stats, index, shape, result)
+            blocked[rays] = result
+
+        if bvh is not None:
+            rays = np.nonzero(~blocked)[0]
+            sub_origins, sub_directions, sub_distances = origins[rays], directions[rays], max_distances[rays]
+
+            def test(primitives, subset):
+                hit = np.zeros(len(subset), dtype=bool)
+                for primitive in primitives:
+                    index, shape = bounded[primitive]
+                    pending = np.nonzero(~hit)[0]
+                    targets = subset[pending]
+                    result = shape.occludes_many(sub_origins[targets], sub_directions[targets], sub_distances[targets])
+                    if stats is not None:
+                        _count_occlusions(stats, index, shape, result)
+                    hit[pending] = result
+                return hit
+
+            blocked[rays] = bvh.any_hit_many(sub_origins, sub_directions, test, sub_distances)
+
+        return blocked
+
+
+def _shape_name(index, shape):
+    """Имя фигуры в статистике: индекс в сцене и класс"""
+    return f"{index}:{type(shape).__name__}"
+
+
+def _count_hits(stats, index, shape, valid):
+    """Учитывает попадания и промахи (valid - bool или маска)"""
+    hits = np.count_nonzero(valid)
+    stats.count_shape(_shape_name(index, shape), hits=hits, misses=np.size(valid) - hits)
+
+
+def _count_occlusions(stats, index, shape, blocked):
+    """Учитывает проверки и срабатывания запросов тени (blocked - bool или маска)"""
+    stats.count_shape(_shape_name(index, shape), occlusion_tests=np.size(blocked),
+                      occlusions=np.count_nonzero(blocked))
@@ -0,0 +1,300 @@
+"""Сцены в файлах JSON/TOML (пример формата - scenes/default.toml) и их перезагрузка на лету"""
+import json
+import os
+import numpy as np
+from AreaLight import AreaLight
+from Animation import shadow_volume_overlaps
+from Camera import Camera
+from MathUtils import vector3
+from Models.IntersectionBatch import IntersectionBatch
+from Models.Material import Material
+from RenderCache import fingerprint
+from Samplers import make_sampler
+from Scene import Scene
+from Shapes.ChessBoard import InfinityChessBoard
+from Shapes.Instance import Instance
+from Shapes.Torus import Torus
+from Shapes.TriangleMesh import TriangleMesh
+
+# Поля, которые считываются как векторы
+VECTOR_FIELDS = {'position', 'look_at', 'up', 'center', 'point', 'normal', 'color', 'color1', 'color2',
+                 'diffuse', 'specular', 'ambient'}
+# Поля фигур, которые меняют только цвет пикселей, но не пересечения и тени
+APPEARANCE_FIELDS = {'material', 'color', 'color1', 'color2', 'checker_size'}
+
+
+class SceneDefinition:
+    """Загруженная сцена: Scene, Camera и цвет фона"""
+
+    def __init__(self, scene, camera, background):
+        self.scene = scene
+        self.camera = camera
+        self.background = background
+
+    def apply(self, tracer):
+        """Подставляет сцену, камеру и фон в трассировщик, сохраняя его статистику и бэкенд"""
+        tracer.scene = self.scene
+        tracer.camera = self.camera
+        tracer.background = self.background
+        tracer.scene.attach_stats(tracer.stats)
+        tracer.set_math_backend(tracer.math_backend)
+
+
+def read_scene_file(path):
+    """Словарь описания сцены из файла .json или .toml"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as file:
+            return json.load(file)
+    if extension == '.toml':
+        with open(path, 'rb') as file:
+            return _toml_module().load(file)
+    raise ValueError(f"Unsupported scene file '{path}', expected .json or .toml")
+
+
+def _toml_module():
+    """tomllib (Python 3.11+) или совместимый пакет tomli для более старых версий"""
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError("TOML scene files need Python 3.11+ or the 'tomli' package; "
+                              "use a .json scene file instead") from None
+    return tomllib
+
+
+def load_scene(path):
+    """Читает файл сцены и строит по нему SceneDefinition"""
+    return build_scene(read_scene_file(path), os.path.dirname(os.path.abspath(path)))
+
+
+def build_scene(data, base_dir='.'):
+    """SceneDefinition по словарю описания сцены (формат - см. scenes/default.toml)"""
+    materials = {name: _material(fields) for name, fields in data.get('materials', {}).items()}
+
+    scene = Scene()
+    for fields in data.get('shapes', []):
+        scene.add(_shape(fields, materials, base_dir))
+    for fields in data.get('lights', []):
+        scene.add_light(_light(fields))
+
+    camera = Camera(**_fields(data.get('camera', {})))
+    background = _vector(data['background']) if 'background' in data else vector3(0.3, 0.4, 0.5)
+    return SceneDefinition(scene, camera, background)
+
+
+def _vector(value):
+    return vector3(*value)
+
+
+def _fields(fields, skip=()):
+    """Аргументы конструктора: векторные поля переводятся в float32-векторы"""
+    return {key: _vector(value) if key in VECTOR_FIELDS else value
+            for key, value in fields.items() if key not in skip}
+
+
+def _material(fields):
+    return Material(**_fields(fields))
+
+
+def _shape(fields, materials, base_dir):
+    kind = fields.get('type')
+    if kind not in SHAPE_TYPES:
+        raise ValueError(f"Unknown shape type '{kind}', expected one of: {', '.join(SHAPE_TYPES)}")
+
+    arguments = _fields(fields, skip=('type', 'name', 'material', 'shape', 'transform', 'path'))
+    if 'material' in fields:
+        material = fields['material']
+        if isinstance(material, str):
+            if material not in materials:
+                raise ValueError(f"Unknown material '{material}'")
+            arguments['material'] = materials[material]
+        else:
+            arguments['material'] = _material(material)
+
+    return SHAPE_TYPES[kind](fields, arguments, materials, base_dir)
+
+
+def _torus(fields, arguments, materials, base_dir):
+    return Torus(**arguments)
+
+
+def _chessboard(fields, arguments, materials, base_dir):
+    return InfinityChessBoard(**arguments)
+
+
+def _mesh(fields, arguments, materials, base_dir):
+    return TriangleMesh(os.path.join(base_dir, fields['path']), **arguments)
+
+
+def _instance(fields, arguments, materials, base_dir):
+    shape = _shape(fields['shape'], materials, base_dir)
+    transform = np.asarray(fields['transform'], dtype=np.float64) if 'transform' in fields else None
+    return Instance(shape, transform, **arguments)
+
+
+SHAPE_TYPES = {
+    'torus': _torus,
+    'chessboard': _chessboard,
+    'mesh': _mesh,
+    'instance': _instance,
+}
+
+
+def _light(fields):
+    kind = fields.get('type', 'area')
+    if kind != 'area':
+        raise ValueError(f"Unknown light type '{kind}', expected 'area'")
+
+    constructor = {key: fields[key] for key in ('size', 'samples') if key in fields}
+    if 'position' in fields:
+        constructor['position'] = _vector(fields['position'])
+    if 'sampler' in fields:
+        constructor['sampler'] = make_sampler(fields['sampler'])
+    light = AreaLight(**constructor)
+
+    # Остальное - поля, которые у AreaLight задаются после создания
+    for key, value in _fields(fields, skip=('type', 'size', 'samples', 'position', 'sampler')).items():
+        if not hasattr(light, key):
+            raise ValueError(f"Unknown area light field '{key}'")
+        setattr(light, key, value)
+    return light
+
+
+class SceneWatcher:
+    """Следит за файлом сцены и после правки перетрассирует только затронутые пиксели.
+
+    Сравниваются отпечатки фигур, источников, камеры и фона. Если у фигуры
+    поменялись только материал или цвет, перерисовываются пиксели, где она
+    видна. Если сдвинулась ее геометрия, к ним добавляются экранная рамка
+    фигуры до и после правки и пиксели, чьи лучи тени могут задеть ее
+    ограничивающую рамку. Правка камеры, фона, источников, бесконечной
+    фигуры или числа фигур перерисовывает кадр целиком.
+    """
+
+    def __init__(self, tracer, path, seed=0):
+        self.tracer = tracer
+        self.path = path
+        self.seed = seed
+        self.image = None  # Текущий кадр (h, w, 3)
+        self.retraced = []  # Доля перетрассированных пикселей после каждой загрузки
+        self._hits = None  # Первичные пересечения текущего кадра
+        self._state = None
+        self._mtime = None
+        self._reloads = 0
+
+    def load(self):
+        """Загружает сцену и рендерит кадр; при повторном вызове перерисовывает только изменения.
+
+        Возвращает маску (h, w) перерисованных пикселей. Версия файла
+        запоминается до разбора, так что файл с ошибкой не перечитывается до
+        следующего сохранения.
+        """
+        self._mtime = os.stat(self.path).st_mtime_ns
+        definition = load_scene(self.path)
+        state = _scene_state(definition, self.tracer.width, self.tracer.height)
+
+        mask = None
+        if self.image is not None:
+            mask = self._affected_pixels(state, definition)
+        definition.apply(self.tracer)
+
+        if mask is None:
+            mask = np.ones((self.tracer.height, self.tracer.width), dtype=bool)
+            self.image = np.zeros((self.tracer.height, self.tracer.width, 3))
+            self._hits = IntersectionBatch(mask.size)
+
+        ys, xs = np.nonzero(mask)
+        if len(xs):
+            hits = IntersectionBatch(len(xs))
+            rng = np.random.default_rng((self.seed, self._reloads))
+            self.image[ys, xs] = self.tracer._render_pixels(xs, ys, rng, hits)
+            self._hits.assign(ys * self.tracer.width + xs, hits)
+
+        self._state = state
+        self._reloads += 1
+        self.retraced.append(len(xs) / mask.size)
+        return mask
+
+    def poll(self):
+        """Перезагружает сцену, если файл изменился; возвращает маску перерисованных пикселей или None"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None  # Файл пересохраняется редактором
+        if mtime == self._mtime:
+            return None
+        return self.load()
+
+    def _affected_pixels(self, state, definition):
+        """Маска пикселей, которые может изменить переход к новой сцене; None - весь кадр"""
+        old = self._state
+        if old['global'] != state['global'] or len(old['shapes']) != len(state['shapes']):
+            return None
+
+        height, width = self.tracer.height, self.tracer.width
+        mask = np.zeros(height * width, dtype=bool)
+        hits = self._hits
+        valid = hits.is_valid()
+        lights = definition.scene.lights
+
+        for index, (before, after) in enumerate(zip(old['shapes'], state['shapes'])):
+            if before['all'] == after['all']:
+                continue
+            # Пиксели, где фигура была видна
+            mask |= hits.shape_index == index
+            if before['geometry'] == after['geometry']:
+                continue  # Поменялись только материал или цвет: тени те же
+
+            for bounds in (before['bounds'], after['bounds']):
+                if bounds is None:
+                    return None
+                rect = _screen_rect(definition.camera, bounds, width, height)
+                if rect is None:
+                    return None
+                x0, y0, x1, y1 = rect
+                mask.reshape(height, width)[y0:y1, x0:x1] = True
+
+                for light in lights:
+                    pixels = np.nonzero(valid & ~mask)[0]
+                    overlaps = shadow_volume_overlaps(hits.point[pixels], light, bounds[0], bounds[1])
+                    mask[pixels[overlaps]] = True
+
+        return mask.reshape(height, width)
+
+
+def _scene_state(definition, width, height):
+    """Отпечатки частей сцены для сравнения версий файла"""
+    shapes = []
+    for shape in definition.scene.shapes:
+        geometry = {k: v for k, v in vars(shape).items()
+                    if k not in APPEARANCE_FIELDS and not k.startswith('_')}
+        shapes.append({
+            'all': fingerprint(shape),
+            'geometry': fingerprint((type(shape).__qualname__, geometry)),
+            'bounds': shape.bounds(),
+        })
+    return {
+        'global': fingerprint((definition.scene.lights, definition.camera, definition.background, width, height)),
+        'shapes': shapes,
+    }
+
+
+def _screen_rect(camera, bounds, width, height):
+    """Пиксельная рамка (x0, y0, x1, y1) проекции рамки bounds; None, если она задевает плоскость камеры"""
+    low, high = (np.asarray(b, dtype=np.float64) for b in bounds)
+    corners = np.array([[x, y, z] for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])])
+    ndc_x, ndc_y, in_front = camera.project(corners)
+    if not np.all(in_front):
+        return None
+
+    # Пиксель (x, y) стреляет лучом в ndc = (2x/W - 1, 1 - 2y/H); запас в пиксель на округление
+    xs = (ndc_x + 1.0) * width / 2.0
+    ys = (1.0 - ndc_y) * height / 2.0
+    x0 = int(np.clip(np.floor(xs.min()) - 1, 0, width))
+    x1 = int(np.clip(np.ceil(xs.max()) + 2, 0, width))
+    y0 = int(np.clip(np.floor(ys.min()) - 1, 0, height))
+    y1 = int(np.clip(np.ceil(ys.max()) + 2, 0, height))
+    return x0, y0, x1, y1
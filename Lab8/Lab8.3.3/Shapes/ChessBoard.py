@@ -1,10 +1,11 @@
 import numpy as np
 import math
 from Models.Ray import Ray
-from Models.IntersectionResult import IntersectionResult
+from Models.IntersectionResult import IntersectionResult, NO_HIT
+from Models.IntersectionBatch import IntersectionBatch
 from Models.Material import Material
 from Shapes.Interfaces.IShape import IShape
-from MathUtils import dot, normalize
+from MathUtils import normalize, MATH_BACKENDS
 
 
 class InfinityChessBoard(IShape):
@@ -67,28 +68,59 @@ class InfinityChessBoard(IShape):
         self.material = value
 
     def intersect(self, ray: Ray) -> IntersectionResult:
-        result = IntersectionResult()
-
-        denom = dot(self.normal, ray.direction)
+        m = MATH_BACKENDS[self.math_backend]
+        normal = m.convert(self.normal)
+        denom = m.dot(normal, ray.direction)
 
         if abs(denom) < 1e-6:
-            return result  # Нет пересечения
+            return NO_HIT  # Нет пересечения
 
-        t = dot(self.point - ray.origin, self.normal) / denom
+        t = m.dot(m.sub(m.convert(self.point), ray.origin), normal) / denom
 
         if t < 0:
-            return result  # Пересечение позади луча
+            return NO_HIT  # Пересечение позади луча
+
+        point = m.add(ray.origin, m.scale(ray.direction, t))
+
+        return IntersectionResult(point, t, normal, m.convert(self._get_color(point)), self.material, self)
+
+    def occludes(self, ray: Ray, max_distance) -> bool:
+        m = MATH_BACKENDS[self.math_backend]
+        normal = m.convert(self.normal)
+        denom = m.dot(normal, ray.direction)
+
+        if abs(denom) < 1e-6:
+            return False
+
+        t = m.dot(m.sub(m.convert(self.point), ray.origin), normal) / denom
+        return 0 <= t < max_distance
 
-        point = ray.at(t)
+    def intersect_many(self, origins, directions) -> IntersectionBatch:
+        batch = IntersectionBatch(len(origins))
 
-        result.point = point
-        result.distance = t
-        result.color = self._get_color(point)
-        result.material = self.material
-        result.normal = self.normal
-        result.shape = self
+        denom = directions @ self.normal
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = ((self.point - origins) @ self.normal) / denom
 
-        return result
+        hit = (np.abs(denom) >= 1e-6) & (t >= 0)
+        if not np.any(hit):
+            return batch
+
+        points = origins[hit] + directions[hit] * t[hit][:, None]
+
+        batch.distance[hit] = t[hit]
+        batch.point[hit] = points
+        batch.normal[hit] = self.normal
+        batch.color[hit] = self._get_colors(points)
+
+        return batch
+
+    def occludes_many(self, origins, directions, max_distances):
+        denom = directions @ self.normal
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = ((self.point - origins) @ self.normal) / denom
+
+        return (np.abs(denom) >= 1e-6) & (t >= 0) & (t < max_distances)
 
     def _get_color(self, point):
         u = point[0] / self.checker_size
@@ -100,4 +132,12 @@ class InfinityChessBoard(IShape):
         if (iu + iv) % 2 == 0:
             return self.color1
         else:
-            return self.color2
\ No newline at end of file
+            return self.color2
+
+    def _get_colors(self, points):
+        """Векторизованная версия _get_color для массива точек (N,3)"""
+        iu = np.floor(points[:, 0] / self.checker_size).astype(np.int64)
+        iv = np.floor(points[:, 2] / self.checker_size).astype(np.int64)
+
+        even = ((iu + iv) % 2 == 0)[:, None]
+        return np.where(even, self.color1, self.color2)
@@ -0,0 +1,128 @@
+import numpy as np
+from Models.Ray import Ray
+from Models.IntersectionResult import IntersectionResult, NO_HIT
+from Models.IntersectionBatch import IntersectionBatch
+from Shapes.Interfaces.IShape import IShape
+from MathUtils import MATH_BACKENDS
+
+
+class Instance(IShape):
+    """Фигура shape, размещенная в сцене матрицей 4x4 transform (объект -> мир).
+
+    Лучи переводятся в систему координат объекта, поэтому одна фигура (тор,
+    сетка) может быть размещена много раз: у экземпляра только матрица и ее
+    обратная. Направление луча после перевода не нормализуется, так что
+    параметр t пересечения одинаков в обеих системах координат.
+    Матрицу нужно заменять целиком: обратная кешируется по объекту transform.
+    """
+
+    def __init__(self, shape, transform=None, material=None, color=None):
+        self.shape = shape
+        self.transform = transform if transform is not None else np.eye(4)
+        self.material = material if material is not None else shape.material
+        self.color = color  # None - цвет самой фигуры
+        self._source = None
+
+    # Свойства для совместимости с C#
+    @property
+    def Transform(self):
+        return self.transform
+
+    @Transform.setter
+    def Transform(self, value):
+        self.transform = value
+
+    @property
+    def Material(self):
+        return self.material
+
+    @Material.setter
+    def Material(self, value):
+        self.material = value
+
+    # Статистика и бэкенд математики - общие с размещаемой фигурой
+    @property
+    def _stats(self):
+        return self.shape._stats
+
+    @_stats.setter
+    def _stats(self, value):
+        self.shape._stats = value
+
+    @property
+    def math_backend(self):
+        return self.shape.math_backend
+
+    @math_backend.setter
+    def math_backend(self, value):
+        self.shape.math_backend = value
+
+    def _matrices(self):
+        """Обратная матрица и матрица нормалей, пересчитываются при замене transform"""
+        if self._source is not self.transform:
+            transform = np.asarray(self.transform, dtype=np.float64)
+            self._matrix = transform
+            self._inverse = np.linalg.inv(transform)
+            self._normal_matrix = self._inverse[:3, :3].T
+            self._source = self.transform
+        return self._matrix, self._inverse, self._normal_matrix
+
+    def bounds(self):
+        shape_bounds = self.shape.bounds()
+        if shape_bounds is None:
+            return None
+
+        matrix = self._matrices()[0]
+        low, high = (np.asarray(b, dtype=np.float64) for b in shape_bounds)
+        corners = np.array([[x, y, z] for x in (low[0], high[0])
+                            for y in (low[1], high[1]) for z in (low[2], high[2])])
+        world = corners @ matrix[:3, :3].T + matrix[:3, 3]
+        return world.min(axis=0), world.max(axis=0)
+
+    def intersect(self, ray: Ray) -> IntersectionResult:
+        m = MATH_BACKENDS[self.math_backend]
+        local = self._local_ray(ray)
+        intersection = self.shape.intersect(local)
+        if not intersection.is_valid():
+            return NO_HIT
+
+        normal_matrix = self._matrices()[2]
+        t = intersection.distance
+        point = np.asarray(ray.origin, dtype=np.float64) + np.asarray(ray.direction, dtype=np.float64) * t
+        normal = normal_matrix @ np.asarray(intersection.normal, dtype=np.float64)
+        normal /= np.linalg.norm(normal)
+        color = intersection.color if self.color is None else self.color
+
+        return IntersectionResult(m.convert(point), t, m.convert(normal), m.convert(color), self.material, self)
+
+    def occludes(self, ray: Ray, max_distance) -> bool:
+        return self.shape.occludes(self._local_ray(ray), max_distance)
+
+    def intersect_many(self, origins, directions) -> IntersectionBatch:
+        local_origins, local_directions = self._local_rays(origins, directions)
+        batch = self.shape.intersect_many(local_origins, local_directions)
+
+        hit = batch.is_valid()
+        if np.any(hit):
+            normals = batch.normal[hit] @ self._matrices()[2].T
+            batch.point[hit] = origins[hit] + directions[hit] * batch.distance[hit][:, None]
+            batch.normal[hit] = normals / np.linalg.norm(normals, axis=1)[:, None]
+            if self.color is not None:
+                batch.color[hit] = self.color
+
+        return batch
+
+    def occludes_many(self, origins, directions, max_distances):
+        local_origins, local_directions = self._local_rays(origins, directions)
+        return self.shape.occludes_many(local_origins, local_directions, max_distances)
+
+    def _local_ray(self, ray):
+        """Луч в системе координат объекта (направление не нормализуется)"""
+        inverse = self._matrices()[1]
+        origin = inverse[:3, :3] @ np.asarray(ray.origin, dtype=np.float64) + inverse[:3, 3]
+        direction = inverse[:3, :3] @ np.asarray(ray.direction, dtype=np.float64)
+        return Ray.normalized(origin, direction)
+
+    def _local_rays(self, origins, directions):
+        inverse = self._matrices()[1]
+        return origins @ inverse[:3, :3].T + inverse[:3, 3], directions @ inverse[:3, :3].T
@@ -1,9 +1,51 @@
 from abc import ABC, abstractmethod
 from Models.Ray import Ray
 from Models.IntersectionResult import IntersectionResult
+from Models.IntersectionBatch import IntersectionBatch
 
 class IShape(ABC):
+    # RenderStats, подключаемый через Scene.attach_stats; None - статистика выключена
+    _stats = None
+    # Бэкенд MathUtils для скалярных intersect/occludes: 'numpy' или 'scalar'
+    math_backend = 'numpy'
+
     @abstractmethod
     def intersect(self, ray: Ray) -> IntersectionResult:
         """Поиск пересечения луча с объектом"""
-        pass
\ No newline at end of file
+        pass
+
+    def occludes(self, ray: Ray, max_distance) -> bool:
+        """Есть ли пересечение ближе max_distance (запрос для лучей тени).
+
+        Фигуры переопределяют его, чтобы не считать точку, нормаль и цвет.
+        """
+        intersection = self.intersect(ray)
+        return intersection.is_valid() and intersection.distance < max_distance
+
+    def occludes_many(self, origins, directions, max_distances):
+        """Пакетная версия occludes, результат - булева маска (N,)"""
+        return self.intersect_many(origins, directions).distance < max_distances
+
+    def bounds(self):
+        """Ограничивающий AABB (min, max) в мировых координатах или None для бесконечных фигур"""
+        return None
+
+    def intersect_many(self, origins, directions) -> IntersectionBatch:
+        """Пакетный поиск пересечений для массивов (N,3) начал и направлений лучей.
+
+        Базовая реализация - адаптер над скалярным intersect для фигур,
+        у которых нет собственной векторизованной версии.
+        """
+        batch = IntersectionBatch(len(origins))
+
+        for i in range(len(origins)):
+            intersection = self.intersect(Ray.normalized(origins[i], directions[i]))
+            if not intersection.is_valid():
+                continue
+
+            batch.distance[i] = intersection.distance
+            batch.point[i] = intersection.point
+            batch.normal[i] = intersection.normal
+            batch.color[i] = intersection.color
+
+        return batch
@@ -1,10 +1,15 @@
 import numpy as np
 import math
 from Models.Ray import Ray
-from Models.IntersectionResult import IntersectionResult
+from Models.IntersectionResult import IntersectionResult, NO_HIT
+from Models.IntersectionBatch import IntersectionBatch
 from Models.Material import Material
 from Shapes.Interfaces.IShape import IShape
-from MathUtils import dot, normalize, vector3
+from MathUtils import MATH_BACKENDS
+from QuarticSolver import solve_quartic, solve_quartic_many
+
+# Допуск на границе отрезка, полученного из ограничивающего объема
+INTERVAL_EPSILON = 1e-6
 
 
 class Torus(IShape):
@@ -57,13 +62,69 @@ class Torus(IShape):
     def Material(self, value):
         self.material = value
 
-    def intersect(self, ray: Ray) -> IntersectionResult:
-        result = IntersectionResult()
-
-        local_origin = ray.origin - self.center
+    def bounds(self):
+        outer = self.major_radius + self.minor_radius
+        extent = np.array([outer, self.minor_radius, outer])
+        return self.center - extent, self.center + extent
 
-        ox, oy, oz = local_origin
-        dx, dy, dz = ray.direction
+    def intersect(self, ray: Ray) -> IntersectionResult:
+        m = MATH_BACKENDS[self.math_backend]
+        center = m.convert(self.center)
+        local_origin = m.sub(ray.origin, center)
+        closest_t = self._closest_distance(local_origin, ray.direction)
+
+        if closest_t is None:
+            return NO_HIT
+
+        point = m.add(local_origin, m.scale(ray.direction, closest_t))
+        world_point = m.add(point, center)
+        normal = self._calculate_normal(point, m)
+
+        return IntersectionResult(world_point, closest_t, normal, m.convert(self.color), self.material, self)
+
+    def occludes(self, ray: Ray, max_distance) -> bool:
+        m = MATH_BACKENDS[self.math_backend]
+        local_origin = m.sub(ray.origin, m.convert(self.center))
+        return self._closest_distance(local_origin, ray.direction, max_distance) is not None
+
+    def intersect_many(self, origins, directions) -> IntersectionBatch:
+        batch = IntersectionBatch(len(origins))
+
+        local_origins = origins - self.center
+        t = self._closest_distances_many(local_origins, directions)
+        hit = np.isfinite(t)
+        if not np.any(hit):
+            return batch
+
+        points = local_origins[hit] + directions[hit] * t[hit][:, None]
+
+        batch.distance[hit] = t[hit]
+        batch.point[hit] = points + self.center
+        batch.normal[hit] = self._calculate_normals(points)
+        batch.color[hit] = self.color
+
+        return batch
+
+    def occludes_many(self, origins, directions, max_distances):
+        return np.isfinite(self._closest_distances_many(origins - self.center, directions, max_distances))
+
+    def _closest_distance(self, local_origin, direction, max_distance=math.inf):
+        """Ближайший корень уравнения тора в (0.001, max_distance] либо None"""
+        # Коэффициенты считаем в float64: в float32 аналитическое решение неточно
+        ox, oy, oz = (float(x) for x in local_origin)
+        dx, dy, dz = (float(x) for x in direction)
+
+        # Дешевое отсечение по ограничивающему объему до решения кварты
+        interval = self._bounding_interval(ox, oy, oz, dx, dy, dz)
+        if interval is None:
+            return None
+        t_near, t_far = interval
+        if t_near > max_distance:
+            return None
+        t_limit = min(t_far + INTERVAL_EPSILON, max_distance)
+
+        # Переносим начало луча к точке входа: корни меньше, кварта обусловлена лучше
+        ox, oy, oz = ox + dx * t_near, oy + dy * t_near, oz + dz * t_near
         R = self.major_radius
         r = self.minor_radius
         R2 = R * R
@@ -81,71 +142,123 @@ class Torus(IShape):
         D = 4 * sum_od * sum_o_sq_minus + 8 * R2 * oy * dy
         E = sum_o_sq_minus * sum_o_sq_minus - 4 * R2 * (r2 - oy * oy)
 
-        roots = self._solve_quartic_optimized(A, B, C, D, E)
+        roots = solve_quartic(A, B, C, D, E, stats=self._stats)
 
         closest_t = None
         for t in roots:
-            if t > 0.001 and (closest_t is None or t < closest_t):
+            t += t_near
+            if 0.001 < t <= t_limit and (closest_t is None or t < closest_t):
                 closest_t = t
 
-        if closest_t is not None:
-            point = local_origin + ray.direction * closest_t
-            world_point = point + self.center
-            normal = self._calculate_normal(point)
-
-            result.point = world_point
-            result.distance = closest_t
-            result.normal = normal
-            result.color = self.color
-            result.material = self.material
-            result.shape = self
-
-        return result
-
-    def _solve_quartic_optimized(self, a, b, c, d, e):
-        roots = []
-
-        # Уменьшаем количество шагов
-        steps = 100
-        max_t = 20.0
-
-        prev_value = self._quartic_function(a, b, c, d, e, 0)
-
-        for i in range(1, steps + 1):
-            t = i * max_t / steps
-            value = self._quartic_function(a, b, c, d, e, t)
-
-            if prev_value * value <= 0:
-                root = self._refine_root_optimized(a, b, c, d, e, t - max_t / steps, t)
-                if abs(self._quartic_function(a, b, c, d, e, root)) < 0.01:
-                    roots.append(root)
-
-            prev_value = value
-
-        return roots
-
-    def _refine_root_optimized(self, a, b, c, d, e, t1, t2):
-        iterations = 5
-        mid = (t1 + t2) * 0.5
-
-        for i in range(iterations):
-            mid = (t1 + t2) * 0.5
-            value = self._quartic_function(a, b, c, d, e, mid)
-
-            if abs(value) < 0.001:
-                return mid
+        return closest_t
+
+    def _closest_distances_many(self, local_origins, directions, max_distances=None):
+        """Пакетная версия _closest_distance; inf для лучей без пересечения"""
+        t = np.full(len(local_origins), np.inf)
+
+        # Кварту решаем только для лучей, прошедших отсечение по ограничивающему объему
+        t_near, t_far = self._bounding_interval_many(local_origins, directions)
+        t_limit = t_far + INTERVAL_EPSILON
+        if max_distances is not None:
+            t_limit = np.minimum(t_limit, max_distances)
+        candidates = np.nonzero(t_near <= t_limit)[0]
+        if len(candidates) == 0:
+            return t
+
+        near = t_near[candidates]
+        shifted = local_origins[candidates] + directions[candidates] * near[:, None]
+        A, B, C, D, E = self._quartic_coefficients_many(shifted, directions[candidates])
+
+        roots = solve_quartic_many(A, B, C, D, E, stats=self._stats) + near[:, None]
+        with np.errstate(invalid='ignore'):
+            inside = (roots > 0.001) & (roots <= t_limit[candidates][:, None])
+        t[candidates] = np.where(inside, roots, np.inf).min(axis=1)
+        return t
+
+    def _bounding_interval(self, ox, oy, oz, dx, dy, dz):
+        """Отрезок луча внутри сферы радиуса R + r и слоя |y| <= r, либо None"""
+        outer = self.major_radius + self.minor_radius
+        r = self.minor_radius
 
-            if self._quartic_function(a, b, c, d, e, t1) * value < 0:
-                t2 = mid
-            else:
-                t1 = mid
+        a = dx * dx + dy * dy + dz * dz
+        b = ox * dx + oy * dy + oz * dz
+        c = ox * ox + oy * oy + oz * oz - outer * outer
+        discriminant = b * b - a * c
+        if discriminant < 0:
+            return None
+
+        root = math.sqrt(discriminant)
+        t_near = (-b - root) / a
+        t_far = (-b + root) / a
+
+        if abs(dy) < 1e-12:
+            if abs(oy) > r:
+                return None
+        else:
+            ty0 = (-r - oy) / dy
+            ty1 = (r - oy) / dy
+            t_near = max(t_near, min(ty0, ty1))
+            t_far = min(t_far, max(ty0, ty1))
+
+        t_near = max(t_near, 0.0)
+        if t_far <= 0.001 or t_near > t_far:
+            return None
+
+        return t_near, t_far
+
+    def _bounding_interval_many(self, local_origins, directions):
+        """Пакетная версия _bounding_interval; для промахов t_near > t_far"""
+        outer = self.major_radius + self.minor_radius
+        r = self.minor_radius
+        oy = local_origins[:, 1]
+        dy = directions[:, 1]
+
+        a = np.einsum('ij,ij->i', directions, directions)
+        b = np.einsum('ij,ij->i', local_origins, directions)
+        c = np.einsum('ij,ij->i', local_origins, local_origins) - outer * outer
+        discriminant = b * b - a * c
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            root = np.sqrt(np.where(discriminant >= 0, discriminant, np.nan))
+            t_near = (-b - root) / a
+            t_far = (-b + root) / a
+
+            ty0 = (-r - oy) / dy
+            ty1 = (r - oy) / dy
+            flat = np.abs(dy) < 1e-12
+            slab_near = np.where(flat, np.where(np.abs(oy) > r, np.inf, -np.inf), np.minimum(ty0, ty1))
+            slab_far = np.where(flat, np.where(np.abs(oy) > r, -np.inf, np.inf), np.maximum(ty0, ty1))
+
+        t_near = np.maximum(np.maximum(t_near, slab_near), 0.0)
+        t_far = np.minimum(t_far, slab_far)
+
+        # nan (промах сферы) и лучи, уходящие от тора, помечаем как пустой отрезок
+        miss = ~(t_far > 0.001) | np.isnan(t_near)
+        t_near[miss] = np.inf
+        t_far[miss] = -np.inf
+        return t_near, t_far
+
+    def _quartic_coefficients_many(self, local_origins, directions):
+        """Коэффициенты уравнения тора для массивов лучей"""
+        R2 = self.major_radius * self.major_radius
+        r2 = self.minor_radius * self.minor_radius
+        oy = local_origins[:, 1]
+        dy = directions[:, 1]
+
+        sum_d_sq = np.einsum('ij,ij->i', directions, directions)
+        sum_o_sq = np.einsum('ij,ij->i', local_origins, local_origins)
+        sum_od = np.einsum('ij,ij->i', local_origins, directions)
+        sum_o_sq_minus = sum_o_sq - R2 - r2
 
-        return mid
+        A = sum_d_sq * sum_d_sq
+        B = 4 * sum_d_sq * sum_od
+        C = 2 * sum_d_sq * sum_o_sq_minus + 4 * sum_od * sum_od + 4 * R2 * dy * dy
+        D = 4 * sum_od * sum_o_sq_minus + 8 * R2 * oy * dy
+        E = sum_o_sq_minus * sum_o_sq_minus - 4 * R2 * (r2 - oy * oy)
 
-    def _quartic_function(self, a, b, c, d, e, t):
-        return a * t * t * t * t + b * t * t * t + c * t * t + d * t + e
+        return A, B, C, D, E
 
-    def _calculate_normal(self, p):
+    def _calculate_normal(self, p, m=MATH_BACKENDS['numpy']):
         x, y, z = p
         R = self.major_radius
         r = self.minor_radius
@@ -155,5 +268,15 @@ class Torus(IShape):
         ny = 4 * y * temp - 4 * R * R * y
         nz = 4 * z * temp
 
-        normal = vector3(nx, ny, nz)
-        return normalize(normal)
\ No newline at end of file
+        normal = m.vector3(nx, ny, nz)
+        return m.normalize(normal)
+
+    def _calculate_normals(self, points):
+        """Векторизованная версия _calculate_normal для массива точек (N,3)"""
+        R2 = self.major_radius * self.major_radius
+        r2 = self.minor_radius * self.minor_radius
+        temp = np.einsum('ij,ij->i', points, points) - R2 - r2
+
+        normals = 4 * points * temp[:, None]
+        normals[:, 1] -= 4 * R2 * points[:, 1]
+        return normals / np.linalg.norm(normals, axis=1)[:, None]
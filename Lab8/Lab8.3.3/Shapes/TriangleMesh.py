@@ -0,0 +1,319 @@
+import numpy as np
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from Models.Ray import Ray
+from Models.IntersectionResult import IntersectionResult, NO_HIT
+from Models.IntersectionBatch import IntersectionBatch
+from Models.Material import Material
+from Shapes.Interfaces.IShape import IShape
+from BVH import BVH
+from MathUtils import MATH_BACKENDS
+from RenderCache import default_cache_dir
+
+# Формат вершин кешей Lab6: текстурные координаты, нормаль, позиция (8 float32)
+VERTEX_FORMAT = 'T2F_N3F_V3F'
+VERTEX_FLOATS = 8
+# Увеличить при изменении формата распакованных файлов или построения BVH
+MESH_CACHE_VERSION = 2
+# Определитель, ниже которого луч считается параллельным треугольнику
+DET_EPSILON = 1e-12
+
+
+class TriangleMesh(IShape):
+    """Треугольная сетка из кеша вершин Lab6 (*.obj.bin + *.obj.json).
+
+    Вершины отображаются в память (np.memmap); .bin в Lab6 сжаты gzip, поэтому
+    при первой загрузке распаковываются в файл рядом с кешем рендера. Вершина
+    и ребра треугольников в float64 и BVH по треугольникам строятся один раз,
+    сохраняются на диск и тоже отображаются в память, так что процессы пула
+    делят страницы файлов, а не держат по копии сетки.
+    """
+
+    def __init__(self, path, material=None, color=None, leaf_size=8, cache_dir=None):
+        self.path = os.path.abspath(_base_path(path))
+        self.leaf_size = leaf_size
+        self.material = material if material is not None else Material()
+        self.color = color if color is not None else np.ones(3, dtype=np.float32)
+        self._cache_dir = cache_dir if cache_dir is not None else os.path.join(default_cache_dir(), 'meshes')
+        self._load()
+
+    # Свойства для совместимости с C#
+    @property
+    def Color(self):
+        return self.color
+
+    @Color.setter
+    def Color(self, value):
+        self.color = value
+
+    @property
+    def Material(self):
+        return self.material
+
+    @Material.setter
+    def Material(self, value):
+        self.material = value
+
+    @property
+    def TriangleCount(self):
+        return len(self._v0)
+
+    def _load(self):
+        vertices = load_vertices(self.path, self._cache_dir)
+        positions = vertices[:, 5:8].reshape(-1, 3, 3)
+
+        # Для Мёллера-Трумбора нужны вершина и два ребра в float64 - срезы отображенного файла
+        triangles = _load_triangles(positions, self._sidecar_base())
+        self._vertices = vertices
+        self._v0 = triangles[:, 0]
+        self._e1 = triangles[:, 1]
+        self._e2 = triangles[:, 2]
+        self._normals = vertices[:, 2:5].reshape(-1, 3, 3)
+        self._bvh = _load_bvh(positions, self.leaf_size, self._sidecar_base())
+
+    def _sidecar_base(self):
+        return _sidecar_base(self.path, self._cache_dir)
+
+    def __getstate__(self):
+        # Вершины и BVH не сериализуются: процесс пула снова читает их из кеша на диске
+        state = {k: v for k, v in self.__dict__.items()
+                 if k not in ('_vertices', '_v0', '_e1', '_e2', '_normals', '_bvh')}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load()
+
+    def bounds(self):
+        return self._bvh.bounds
+
+    def intersect(self, ray: Ray) -> IntersectionResult:
+        m = MATH_BACKENDS[self.math_backend]
+        origin = np.asarray(ray.origin, dtype=np.float64)
+        direction = np.asarray(ray.direction, dtype=np.float64)
+        closest_t = np.inf
+        closest = None
+
+        def visit(primitives):
+            nonlocal closest_t, closest
+            triangles = np.array(primitives)
+            t, u, v = _moller_trumbore(origin, direction,
+                                       self._v0[triangles], self._e1[triangles], self._e2[triangles])
+            i = int(np.argmin(t))
+            if t[i] < closest_t:
+                closest_t = float(t[i])
+                closest = (triangles[i], u[i], v[i])
+            return closest_t
+
+        self._bvh.traverse(origin, direction, visit)
+
+        if closest is None:
+            return NO_HIT
+
+        triangle, u, v = closest
+        point = origin + direction * closest_t
+        normal = self._interpolate_normals(np.array([triangle]), np.array([u]), np.array([v]))[0]
+        return IntersectionResult(m.convert(point), closest_t, m.convert(normal), m.convert(self.color),
+                                  self.material, self)
+
+    def occludes(self, ray: Ray, max_distance) -> bool:
+        origin = np.asarray(ray.origin, dtype=np.float64)
+        direction = np.asarray(ray.direction, dtype=np.float64)
+
+        def test(primitives):
+            triangles = np.array(primitives)
+            t, u, v = _moller_trumbore(origin, direction,
+                                       self._v0[triangles], self._e1[triangles], self._e2[triangles])
+            return bool(np.any(t < max_distance))
+
+        return self._bvh.any_hit(origin, direction, test, max_distance)
+
+    def intersect_many(self, origins, directions) -> IntersectionBatch:
+        batch = IntersectionBatch(len(origins))
+        closest_t = np.full(len(origins), np.inf)
+        triangle = np.full(len(origins), -1, dtype=np.int64)
+        u = np.zeros(len(origins))
+        v = np.zeros(len(origins))
+
+        def visit(primitives, rays):
+            t, leaf_u, leaf_v = self._intersect_leaf(origins, directions, primitives, rays)
+            best = np.argmin(t, axis=1)
+            rows = np.arange(len(rays))
+            best_t = t[rows, best]
+
+            closer = best_t < closest_t[rays]
+            updated = rays[closer]
+            closest_t[updated] = best_t[closer]
+            triangle[updated] = primitives[best[closer]]
+            u[updated] = leaf_u[rows, best][closer]
+            v[updated] = leaf_v[rows, best][closer]
+            return closest_t[rays]
+
+        self._bvh.traverse_many(origins, directions, visit)
+
+        hit = triangle >= 0
+        if not np.any(hit):
+            return batch
+
+        batch.distance[hit] = closest_t[hit]
+        batch.point[hit] = origins[hit] + directions[hit] * closest_t[hit][:, None]
+        batch.normal[hit] = self._interpolate_normals(triangle[hit], u[hit], v[hit])
+        batch.color[hit] = self.color
+        return batch
+
+    def occludes_many(self, origins, directions, max_distances):
+        max_distances = np.asarray(max_distances, dtype=np.float64)
+
+        def test(primitives, rays):
+            t, u, v = self._intersect_leaf(origins, directions, primitives, rays)
+            return t.min(axis=1) < max_distances[rays]
+
+        return self._bvh.any_hit_many(origins, directions, test, max_distances)
+
+    def _intersect_leaf(self, origins, directions, primitives, rays):
+        """Пересечения лучей rays со всеми треугольниками листа, массивы (лучи, треугольники)"""
+        return _moller_trumbore(origins[rays][:, None, :], directions[rays][:, None, :],
+                                self._v0[primitives][None], self._e1[primitives][None],
+                                self._e2[primitives][None])
+
+    def _interpolate_normals(self, triangles, u, v):
+        """Нормали в точках с барицентрическими координатами (u, v), интерполированные по вершинам"""
+        normals = self._normals[triangles].astype(np.float64)
+        interpolated = (normals[:, 0] * (1 - u - v)[:, None]
+                        + normals[:, 1] * u[:, None]
+                        + normals[:, 2] * v[:, None])
+        norm = np.linalg.norm(interpolated, axis=1)
+
+        # Вырожденные нормали вершин заменяем геометрической нормалью грани
+        degenerate = norm == 0
+        if np.any(degenerate):
+            face = np.cross(self._e1[triangles[degenerate]], self._e2[triangles[degenerate]])
+            interpolated[degenerate] = face
+            norm[degenerate] = np.linalg.norm(face, axis=1)
+
+        return interpolated / norm[:, None]
+
+
+def _moller_trumbore(origins, directions, v0, e1, e2):
+    """Пересечение лучей с треугольниками (алгоритм Мёллера-Трумбора).
+
+    Аргументы - массивы (..., 3), согласованные по правилам broadcasting.
+    Возвращает t (inf для промахов) и барицентрические координаты u, v.
+    """
+    p = np.cross(directions, e2)
+    det = (e1 * p).sum(axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_det = 1.0 / det
+        s = origins - v0
+        u = (s * p).sum(axis=-1) * inv_det
+        q = np.cross(s, e1)
+        v = (directions * q).sum(axis=-1) * inv_det
+        t = (e2 * q).sum(axis=-1) * inv_det
+
+        hit = (np.abs(det) > DET_EPSILON) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0.001)
+    return np.where(hit, t, np.inf), u, v
+
+
+def _base_path(path):
+    """Путь вида X.obj по любому из X.obj, X.obj.bin, X.obj.json"""
+    for suffix in ('.bin', '.json'):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def _sidecar_base(path, cache_dir):
+    """Общий префикс файлов кеша сетки, зависящий от пути и версии .bin"""
+    stat = os.stat(path + '.bin')
+    key = f'{MESH_CACHE_VERSION}:{path}:{stat.st_size}:{stat.st_mtime_ns}'
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{os.path.basename(path)}-{digest}')
+
+
+def load_vertices(path, cache_dir):
+    """Вершины сетки X.obj (X.obj.bin + X.obj.json) как np.memmap (N, 8) float32.
+
+    Сжатый gzip .bin один раз распаковывается в cache_dir, дальше
+    отображается в память распакованный файл.
+    """
+    with open(path + '.json') as file:
+        meta = json.load(file)
+
+    buffers = meta['vertex_buffers']
+    for buffer in buffers:
+        if buffer['vertex_format'] != VERTEX_FORMAT:
+            raise ValueError(f"Unsupported vertex format {buffer['vertex_format']} in {path}.json")
+
+    source = path + '.bin'
+    with open(source, 'rb') as file:
+        compressed = file.read(2) == b'\x1f\x8b'
+
+    if compressed:
+        raw = _sidecar_base(path, cache_dir) + '.vertices'
+        if not os.path.exists(raw):
+            _write_atomically(raw, lambda output: _decompress(source, output))
+        source = raw
+
+    data = np.memmap(source, dtype=np.float32, mode='r')
+    parts = [data[buffer['byte_offset'] // 4:(buffer['byte_offset'] + buffer['byte_length']) // 4]
+             for buffer in buffers]
+    vertices = parts[0] if len(parts) == 1 else np.concatenate(parts)
+    return vertices.reshape(-1, VERTEX_FLOATS)
+
+
+def _decompress(source, output):
+    """Распаковывает gzip-файл source в открытый файл output"""
+    with gzip.open(source, 'rb') as stream:
+        shutil.copyfileobj(stream, output, 1 << 20)
+
+
+def _write_atomically(target, write):
+    """Создает файл target: write(файл) пишет во временный файл, который затем переименовывается"""
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            write(output)
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _load_triangles(positions, sidecar_base):
+    """Массив (T, 3, 3) float64 из вершины v0 и ребер e1, e2 каждого треугольника как np.memmap.
+
+    При первой загрузке считается по positions и сохраняется в .npy рядом с кешем.
+    """
+    path = f'{sidecar_base}.triangles.npy'
+    try:
+        triangles = np.load(path, mmap_mode='r')
+        if triangles.shape == positions.shape and triangles.dtype == np.float64:
+            return triangles
+    except (OSError, ValueError):
+        pass
+
+    v0 = positions[:, 0].astype(np.float64)
+    triangles = np.stack([v0, positions[:, 1] - v0, positions[:, 2] - v0], axis=1)
+    _write_atomically(path, lambda output: np.save(output, triangles))
+    return np.load(path, mmap_mode='r')
+
+
+def _load_bvh(positions, leaf_size, sidecar_base):
+    """BVH по треугольникам: с диска, если уже строился, иначе строит и сохраняет"""
+    path = f'{sidecar_base}.bvh{leaf_size}.npz'
+    try:
+        with np.load(path) as arrays:
+            return BVH.from_arrays(arrays)
+    except (OSError, KeyError, ValueError):
+        pass
+
+    bvh = BVH(positions.min(axis=1), positions.max(axis=1), leaf_size)
+    _write_atomically(path, lambda file: np.savez(file, **bvh.to_arrays()))
+    return bvh
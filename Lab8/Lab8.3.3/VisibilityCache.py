@@ -0,0 +1,113 @@
+import numpy as np
+from RenderCache import fingerprint
+
+# Бит на координату ячейки в ключе; координаты за пределами диапазона не кешируются
+CELL_BITS = 20
+CELL_LIMIT = 1 << (CELL_BITS - 1)
+
+
+class VisibilityCache:
+    """Мировой кеш видимости источника света для пролетов камеры.
+
+    Пространственная хеш-сетка: ячейка - куб со стороной cell_size плюс одна из
+    шести основных ориентаций нормали (чтобы не смешивать, например, верх и низ
+    тонкой фигуры). Для ячейки накапливается число видимых и брошенных лучей
+    тени; когда их набирается min_samples, доля видимых сэмплов используется
+    вместо новых лучей тени. Кеш очищается при изменении фигур или источников.
+
+    Процессы тайлового рендера получают копию кеша вместе с трассировщиком на
+    каждый кадр и возвращают с тайлами свои пополнения (record/take_recorded),
+    которые родительский процесс сливает в свой кеш (merge).
+    """
+
+    def __init__(self, cell_size=0.05, min_samples=16):
+        self.cell_size = cell_size
+        self.min_samples = min_samples
+        self.hits = 0  # Точки, для которых лучи тени не понадобились
+        self.misses = 0
+        self._cells = {}  # ключ ячейки -> [видимых сэмплов, всего сэмплов]
+        self._scene_key = None
+        self._recorded = None  # Пополнения с вызова record(): ключ ячейки -> [видимых, всего]
+
+    def __len__(self):
+        return len(self._cells)
+
+    def clear(self):
+        self._cells.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, scene):
+        """Очищает кеш, если фигуры или источники света сцены изменились с прошлой проверки"""
+        key = fingerprint((scene.shapes, scene.lights))
+        if key != self._scene_key:
+            self.clear()
+            self._scene_key = key
+
+    def cell_keys(self, points, normals):
+        """Ключи ячеек для точек (N,3) с нормалями (N,3); -1 для точек вне сетки"""
+        cells = np.floor(np.asarray(points, dtype=np.float64) / self.cell_size)
+        inside = np.all(np.abs(cells) < CELL_LIMIT, axis=1)
+        cells = np.where(inside[:, None], cells, 0).astype(np.int64) + CELL_LIMIT
+
+        # Основная ось нормали и ее знак: 6 ориентаций
+        normals = np.asarray(normals, dtype=np.float64)
+        axis = np.argmax(np.abs(normals), axis=1)
+        orientation = 2 * axis + (normals[np.arange(len(normals)), axis] < 0)
+
+        keys = (((orientation << CELL_BITS | cells[:, 0]) << CELL_BITS | cells[:, 1]) << CELL_BITS) | cells[:, 2]
+        return np.where(inside, keys, -1)
+
+    def lookup(self, points, normals):
+        """Доля видимых сэмплов для точек; nan, если в ячейке пока мало сэмплов"""
+        fractions = np.full(len(points), np.nan)
+        cells = self._cells
+        for i, key in enumerate(self.cell_keys(points, normals).tolist()):
+            entry = cells.get(key)
+            if entry is not None and entry[1] >= self.min_samples:
+                fractions[i] = entry[0] / entry[1]
+
+        found = np.count_nonzero(~np.isnan(fractions))
+        self.hits += found
+        self.misses += len(points) - found
+        return fractions
+
+    def add(self, points, normals, visible, taken):
+        """Добавляет результаты лучей тени: visible видимых из taken для каждой точки"""
+        cells = self._cells
+        keys = self.cell_keys(points, normals).tolist()
+        for key, seen, total in zip(keys, np.asarray(visible).tolist(), np.asarray(taken).tolist()):
+            if key < 0:
+                continue
+            _add_cell(cells, key, seen, total)
+            if self._recorded is not None:
+                _add_cell(self._recorded, key, seen, total)
+
+    def record(self):
+        """Начинает запись пополнений кеша и обнуляет счетчики hits и misses"""
+        self._recorded = {}
+        self.hits = 0
+        self.misses = 0
+
+    def take_recorded(self):
+        """Пополнения и счетчики с вызова record() для merge в другой копии кеша"""
+        recorded = (self._recorded or {}, self.hits, self.misses)
+        self._recorded = None
+        return recorded
+
+    def merge(self, recorded):
+        """Сливает пополнения take_recorded() из копии кеша в процессе тайлового рендера"""
+        cells, hits, misses = recorded
+        for key, (seen, total) in cells.items():
+            _add_cell(self._cells, key, seen, total)
+        self.hits += hits
+        self.misses += misses
+
+
+def _add_cell(cells, key, seen, total):
+    entry = cells.get(key)
+    if entry is None:
+        cells[key] = [seen, total]
+    else:
+        entry[0] += seen
+        entry[1] += total
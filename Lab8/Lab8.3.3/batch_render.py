@@ -0,0 +1,195 @@
+"""Пакетный рендер сцены Lab8 без окна: python batch_render.py -o frame.png"""
+import os
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import sys
+import time
+import numpy as np
+import pygame
+from Distributed import TileCoordinator, parse_address
+from RayTracer import RayTracer
+from RenderCache import RenderCache
+from RenderStats import print_progress
+from Samplers import SAMPLERS, make_sampler
+from VisibilityCache import VisibilityCache
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch renderer for the Lab8 ray tracer")
+    parser.add_argument('-o', '--output', required=True,
+                        help="output file: .png (8-bit), .npy or .pfm (linear float)")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--mode', choices=('tiled', 'antialiased', 'denoised', 'distributed', 'scalar'),
+                        default='tiled',
+                        help="tiled - batched tiles in a process pool; antialiased - batched kernel with "
+                             "edge-adaptive AA in one process; denoised - few shadow rays with edge-aware "
+                             "visibility filtering in one process; distributed - tiles rendered by "
+                             "Distributed.py workers over TCP; scalar - original per-pixel tracer")
+    parser.add_argument('--scene', default=None, help="scene file (.toml or .json) instead of the built-in scene")
+    parser.add_argument('--samples', type=int, default=None, help="area light shadow samples")
+    parser.add_argument('--adaptive', action='store_true', help="adaptive shadow sampling")
+    parser.add_argument('--min-samples', type=int, default=None, help="adaptive sampling minimum (implies --adaptive)")
+    parser.add_argument('--max-samples', type=int, default=None, help="adaptive sampling maximum (implies --adaptive)")
+    parser.add_argument('--sampler', choices=sorted(SAMPLERS), default=None)
+    parser.add_argument('--aa-samples', type=int, default=4, help="sub-pixel rays per edge pixel")
+    parser.add_argument('--aa-budget', type=float, default=0.1, help="max fraction of pixels to antialias")
+    parser.add_argument('--shadow-samples', type=int, default=4, help="shadow rays per hit in denoised mode")
+    parser.add_argument('--denoise-iterations', type=int, default=2, help="a-trous filter passes in denoised mode")
+    parser.add_argument('--math-backend', choices=('numpy', 'scalar'), default='numpy',
+                        help="vector math backend of the scalar tracer (--mode scalar)")
+    parser.add_argument('--tile-size', type=int, default=None, help="tile edge in pixels, tiled and distributed modes "
+                                                                     "(default: 32)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes, tiled mode only (default: all cores)")
+    parser.add_argument('--listen', default='127.0.0.1:0',
+                        help="distributed mode: coordinator address host:port (0.0.0.0 to accept LAN workers)")
+    parser.add_argument('--local-workers', type=int, default=None,
+                        help="distributed mode: workers to start on this machine (default: all cores)")
+    parser.add_argument('--authkey', default=None,
+                        help="distributed mode: shared worker key (default: a random key, printed on start)")
+    parser.add_argument('--tile-timeout', type=float, default=60.0,
+                        help="distributed mode: reassign a tile if its worker is silent this many seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', default=None, help="enable the on-disk render cache in this directory")
+    parser.add_argument('--visibility-cache', action='store_true',
+                        help="reuse shadow visibility from a world-space grid instead of casting every shadow "
+                             "ray (approximate; disables --cache-dir)")
+    parser.add_argument('--stats', metavar='FILE', default=None, help="write ray and timing statistics as JSON")
+    parser.add_argument('--progress', action='store_true', help="print rendering progress")
+    args = parser.parse_args(argv)
+
+    # Параметры, которые выбранный режим не использует, не должны пропадать молча
+    if args.workers is not None and args.mode != 'tiled':
+        print(f"warning: --workers is ignored in {args.mode} mode", file=sys.stderr)
+    if args.tile_size is not None and args.mode not in ('tiled', 'distributed'):
+        print(f"warning: --tile-size is ignored in {args.mode} mode", file=sys.stderr)
+    if args.tile_size is None:
+        args.tile_size = 32
+    if args.min_samples is not None or args.max_samples is not None:
+        args.adaptive = True  # Без адаптивной выборки границы числа сэмплов ни на что не влияют
+    return args
+
+
+def configure(tracer, args):
+    """Применяет параметры командной строки к сцене и источнику света трассировщика"""
+    if args.scene is not None:
+        # Модуль сцен из файлов нужен только с --scene
+        from SceneFile import load_scene
+        load_scene(args.scene).apply(tracer)
+
+    for light in tracer.scene.lights:
+        if args.samples is not None:
+            light.samples = args.samples
+            light.max_samples = args.samples
+        if args.adaptive:
+            light.adaptive = True
+        if args.min_samples is not None:
+            light.min_samples = args.min_samples
+        if args.max_samples is not None:
+            light.max_samples = args.max_samples
+        if args.sampler is not None:
+            light.sampler = make_sampler(args.sampler)
+
+    tracer.set_math_backend(args.math_backend)
+
+    if args.cache_dir is not None:
+        tracer.cache = RenderCache(args.cache_dir)
+    if args.visibility_cache:
+        tracer.visibility_cache = VisibilityCache()
+
+    if args.progress:
+        tracer.progress_callback = print_progress
+
+    tracer.enable_stats()
+
+
+def render(tracer, args):
+    """Рендерит кадр выбранным режимом, результат - float-изображение (h, w, 3)"""
+    if args.mode == 'distributed':
+        return render_distributed(tracer, args)
+
+    # Для float-вывода берем кадр до квантования в 8 бит (кеш хранит только 8-битные кадры)
+    if args.output.lower().endswith(('.npy', '.pfm')) and tracer.cache is None:
+        if args.mode == 'tiled':
+            return tracer.render_image(args.tile_size, args.workers, args.seed)
+        if args.mode == 'antialiased':
+            return tracer.render_antialiased_image(args.seed, args.aa_samples, args.aa_budget)
+        if args.mode == 'denoised':
+            return tracer.render_denoised_image(args.seed, args.shadow_samples, args.denoise_iterations)
+
+    if args.mode == 'tiled':
+        surface = tracer.render_tiled(args.tile_size, args.workers, args.seed)
+    elif args.mode == 'antialiased':
+        surface = tracer.render_antialiased(args.seed, args.aa_samples, args.aa_budget)
+    elif args.mode == 'denoised':
+        surface = tracer.render_denoised(args.seed, args.shadow_samples, args.denoise_iterations)
+    else:
+        surface = tracer.render()
+
+    return pygame.surfarray.array3d(surface).transpose(1, 0, 2) / 255.0
+
+
+def render_distributed(tracer, args):
+    """Рендерит кадр процессами Distributed.py, подключенными к координатору"""
+    local_workers = args.local_workers if args.local_workers is not None else os.cpu_count() or 1
+    authkey = args.authkey.encode() if args.authkey is not None else None
+    with TileCoordinator(tracer, parse_address(args.listen), authkey, args.tile_size,
+                         args.seed, args.tile_timeout) as coordinator:
+        host, port = coordinator.address
+        print(f"Coordinator listening on {host}:{port}; start workers with: "
+              f"python Distributed.py {host}:{port} --authkey {coordinator.authkey.decode()}")
+        coordinator.start_local_workers(local_workers)
+        return coordinator.render_image()
+
+
+def write_image(path, image):
+    """Сохраняет изображение (h, w, 3) в PNG, .npy или PFM по расширению файла"""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.npy':
+        np.save(path, image.astype(np.float32))
+    elif extension == '.pfm':
+        with open(path, 'wb') as file:
+            height, width = image.shape[:2]
+            file.write(f'PF\n{width} {height}\n-1.0\n'.encode('ascii'))
+            # PFM хранит строки снизу вверх, little-endian float32
+            file.write(np.ascontiguousarray(image[::-1], dtype='<f4').tobytes())
+    else:
+        surface = pygame.surfarray.make_surface(RayTracer._to_pixels(image))
+        pygame.image.save(surface, path)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    start = time.perf_counter()
+    tracer = RayTracer(args.width, args.height)
+    configure(tracer, args)
+    setup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image = render(tracer, args)
+    render_time = time.perf_counter() - start
+
+    write_image(args.output, image)
+
+    stats = tracer.stats
+    print(f"Rendered {args.width}x{args.height} ({args.mode}) -> {args.output}")
+    print(f"  setup:  {setup_time:.3f} s")
+    print(f"  render: {render_time:.3f} s")
+    print(f"  primary rays: {stats.counters['primary_rays']}, shadow rays: {stats.counters['shadow_rays']} "
+          f"({stats.total_rays / render_time:,.0f} rays/sec)")
+    # В многопроцессном режиме время фаз суммируется по всем процессам
+    for phase, seconds in sorted(stats.phase_times.items()):
+        print(f"  {phase + ':':16s}{seconds:.3f} s")
+
+    if args.stats:
+        stats.to_json(args.stats)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Замеры горячих участков трассировщика: python benchmark.py -o results.json [--compare baseline.json]"""
+import os
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+from Models.Ray import Ray
+from RayTracer import RayTracer
+from MathUtils import vector3, normalize, MATH_BACKENDS
+from Animation import turntable
+
+# Разрешения для замеров полного рендера
+RENDER_SIZES = [(80, 60), (160, 120), (320, 240)]
+
+# Операции MathUtils, сравниваемые между бэкендами: имя -> (функция бэкенда, аргументы)
+MATH_OPERATIONS = {
+    'dot': lambda m, a, b: m.dot(a, b),
+    'normalize': lambda m, a, b: m.normalize(a),
+    'length': lambda m, a, b: m.length(a),
+    'reflect': lambda m, a, b: m.reflect(a, b),
+    'clamp': lambda m, a, b: m.clamp(a, 0, 1),
+}
+
+
+def _timeit(function, min_time=0.2, repeats=5):
+    """Время одного вызова function: подбирает число вызовов на серию, возвращает статистику"""
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(iterations):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats or iterations >= 1 << 20:
+            break
+        iterations *= 2
+
+    samples = [elapsed / iterations]
+    for i in range(repeats - 1):
+        start = time.perf_counter()
+        for j in range(iterations):
+            function()
+        samples.append((time.perf_counter() - start) / iterations)
+
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'mean': statistics.fmean(samples),
+        'iterations': iterations,
+        'repeats': repeats,
+    }
+
+
+def _benchmarks(quick):
+    """Словарь имя -> функция без аргументов для замера"""
+    tracer = RayTracer(80, 60)
+    scene = tracer.scene
+    torus, board = scene.shapes[0], scene.shapes[1]
+    light = scene.lights[0]
+    camera = tracer.camera.position
+
+    hit_ray = Ray(camera, normalize(vector3(0.8, 0.2, -3) - camera))
+    miss_ray = Ray(camera, vector3(0, 1, 0))
+    floor_ray = Ray(camera, normalize(vector3(1, -1, -4) - camera))
+    assert torus.intersect(hit_ray).is_valid() and not torus.intersect(miss_ray).is_valid()
+
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(0, tracer.width, 4096)
+    ys = rng.uniform(0, tracer.height, 4096)
+    origins, directions = tracer._primary_rays(xs, ys)
+
+    benchmarks = {
+        'torus.intersect.hit': lambda: torus.intersect(hit_ray),
+        'torus.intersect.miss': lambda: torus.intersect(miss_ray),
+        'torus.occludes.hit': lambda: torus.occludes(hit_ray, 100.0),
+        'chessboard.intersect': lambda: board.intersect(floor_ray),
+        'scene.intersect': lambda: scene.intersect(floor_ray),
+        'scene.occluded': lambda: scene.occluded(floor_ray, 100.0),
+        'arealight.get_samples_points': lambda: light.get_samples_points(),
+        'raytracer.trace_ray': lambda: tracer._trace_ray(floor_ray),
+        'torus.intersect_many.4096': lambda: torus.intersect_many(origins, directions),
+        'scene.intersect_many.4096': lambda: scene.intersect_many(origins, directions),
+        'raytracer.trace_many.4096': lambda: tracer._trace_many(origins, directions, rng),
+    }
+
+    scalar_tracer = RayTracer(80, 60)
+    scalar_tracer.set_math_backend('scalar')
+    scalar_ray = Ray.normalized(tuple(map(float, camera)), tuple(map(float, floor_ray.direction)))
+    benchmarks['raytracer.trace_ray.scalar_math'] = lambda: scalar_tracer._trace_ray(scalar_ray)
+
+    for backend, m in MATH_BACKENDS.items():
+        a = m.convert(normalize(vector3(0.3, -0.5, 0.8)))
+        b = m.convert(vector3(0, 1, 0))
+        for name, operation in MATH_OPERATIONS.items():
+            benchmarks[f'mathutils.{backend}.{name}'] = \
+                lambda operation=operation, m=m, a=a, b=b: operation(m, a, b)
+
+    for width, height in RENDER_SIZES[:1] if quick else RENDER_SIZES:
+        render_tracer = RayTracer(width, height)
+        benchmarks[f'render.tiled.{width}x{height}'] = \
+            lambda t=render_tracer: t.render_image(workers=1)
+
+    sequence_tracer = RayTracer(*RENDER_SIZES[0])
+    frames = turntable(sequence_tracer.camera, 4, 0.02)
+    benchmarks['render.sequence.turntable.4'] = lambda: list(sequence_tracer.render_sequence(frames))
+
+    return benchmarks
+
+
+def run(selected=None, quick=False):
+    """Выполняет замеры, имена которых содержат одну из подстрок selected"""
+    results = {}
+    for name, function in _benchmarks(quick).items():
+        if selected and not any(part in name for part in selected):
+            continue
+        results[name] = _timeit(function, min_time=0.05 if quick else 0.2)
+        print(f"{name:36s} {results[name]['median'] * 1e6:14.1f} us/call")
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+        },
+        'results': results,
+    }
+
+
+def math_speedups(current):
+    """Печатает ускорение скалярного бэкенда MathUtils относительно NumPy по операциям"""
+    results = current['results']
+    for name in MATH_OPERATIONS:
+        numpy_result = results.get(f'mathutils.numpy.{name}')
+        scalar_result = results.get(f'mathutils.scalar.{name}')
+        if numpy_result and scalar_result:
+            print(f"mathutils.{name:27s} scalar x{numpy_result['median'] / scalar_result['median']:5.1f} faster")
+
+
+def compare(current, baseline, threshold):
+    """Список замедлений: (имя, было, стало, отношение) для медиан хуже порога"""
+    regressions = []
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        ratio = result['median'] / reference['median']
+        marker = 'REGRESSION' if ratio > 1 + threshold else ('faster' if ratio < 1 - threshold else '')
+        print(f"{name:36s} {reference['median'] * 1e6:12.1f} -> {result['median'] * 1e6:12.1f} us"
+              f"  x{ratio:5.2f} {marker}")
+        if ratio > 1 + threshold:
+            regressions.append((name, reference['median'], result['median'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite for the Lab8 ray tracer hot paths")
+    parser.add_argument('-o', '--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare against a stored JSON baseline")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative slowdown of the median reported as a regression (default 0.1)")
+    parser.add_argument('--filter', nargs='*', help="run only benchmarks whose name contains one of these")
+    parser.add_argument('--quick', action='store_true', help="shorter timings and only the smallest render")
+    args = parser.parse_args(argv)
+
+    current = run(args.filter, args.quick)
+    math_speedups(current)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print()
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
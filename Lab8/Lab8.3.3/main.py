@@ -1,9 +1,22 @@
+import argparse
 import pygame
 import sys
 from RayTracer import RayTracer
+from Preview import InteractivePreview
+from VisibilityCache import VisibilityCache
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Lab8 ray tracer viewer")
+    parser.add_argument('--interactive', action='store_true',
+                        help="move the camera with WASD/QE and the mouse, refine the frame when it stops")
+    parser.add_argument('--scene', help="scene file (.toml or .json) instead of the built-in scene")
+    parser.add_argument('--watch', action='store_true',
+                        help="with --scene: re-render the pixels affected by each saved edit of the file")
+    parser.add_argument('--visibility-cache', action='store_true',
+                        help="reuse shadow visibility between frames from a world-space grid (approximate)")
+    args = parser.parse_args()
+
     # Инициализация Pygame
     pygame.init()
 
@@ -15,28 +28,90 @@ def main():
     # Создаем рендерер
     print("Initializing ray tracer...")
     ray_tracer = RayTracer(width, height)
+    if args.visibility_cache:
+        ray_tracer.visibility_cache = VisibilityCache()
+
+    if args.scene and args.watch:
+        watch(screen, ray_tracer, args.scene)
+        pygame.quit()
+        sys.exit()
+    if args.scene:
+        # Модуль сцен из файлов нужен только с --scene
+        from SceneFile import load_scene
+        load_scene(args.scene).apply(ray_tracer)
+
+    if args.interactive:
+        InteractivePreview(ray_tracer, screen).run()
+        pygame.quit()
+        sys.exit()
 
-    # Рендерим сцену
+    # Рендерим сцену по частям, показывая их по мере готовности
     print("Rendering scene...")
-    image = ray_tracer.render()
+    image = pygame.Surface((width, height))
+    progress = ray_tracer.render_progressive(image)
+    rendering = True
 
     # Главный цикл
     running = True
     while running:
-        for event in pygame.event.get():
+        # Пока идет рендер, события только опрашиваем; после - ждем их, не нагружая процессор
+        events = pygame.event.get() if rendering else [pygame.event.wait()]
+
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # Окно нужно перерисовать целиком
+                screen.blit(image, (0, 0))
+                pygame.display.flip()
 
-        # Отображаем рендер
-        screen.blit(image, (0, 0))
-        pygame.display.flip()
+        if rendering and running:
+            try:
+                rect = next(progress)
+            except StopIteration:
+                rendering = False
+                print("Rendering finished")
+            else:
+                # Отображаем готовую часть рендера
+                screen.blit(image, rect, rect)
+                pygame.display.update(rect)
 
+    # Останавливает пул процессов, если окно закрыли до конца рендера
+    progress.close()
     pygame.quit()
     sys.exit()
 
 
+def watch(screen, ray_tracer, path):
+    """Показывает сцену из файла path и перерисовывает ее после каждого сохранения файла"""
+    from SceneFile import SceneWatcher
+    watcher = SceneWatcher(ray_tracer, path)
+    print(f"Rendering {path}...")
+    watcher.load()
+
+    while True:
+        screen.blit(ray_tracer._to_surface(watcher.image), (0, 0))
+        pygame.display.flip()
+
+        # Ждем событий не дольше полсекунды, затем проверяем файл
+        changed = None
+        while changed is None:
+            event = pygame.event.wait(500)
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                break
+            try:
+                changed = watcher.poll()
+            except (OSError, ValueError, KeyError, TypeError) as error:
+                # Недописанный или ошибочный файл: ждем следующего сохранения
+                print(f"Scene not reloaded: {error}")
+        if changed is not None:
+            print(f"Reloaded {path}: re-traced {changed.mean() * 100:.1f}% of pixels")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()